@@ -2,12 +2,22 @@
 import streamlit as st
 import os
 import time
-from typing import List, Dict, Any, Annotated, Sequence, TypedDict, Union
-import pandas as pd
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+@st.cache_resource(show_spinner=False)
+def load_env_config():
+    """.env 파일 로드 및 환경 변수 조회 - rerun마다 반복하지 않도록 프로세스당 한 번만 실행"""
+    load_dotenv()
+    return SimpleNamespace(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        anthropic_api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        admin_pass=os.environ.get("ADMIN_PASS"),
+        user_pass=os.environ.get("USER_PASS")
+    )
 
 # .env 파일 로드
-from dotenv import load_dotenv
-load_dotenv()
+env_config = load_env_config()
 
 # 모듈 임포트
 from user_manager import UserManager, admin_panel
@@ -22,46 +32,42 @@ from conversation_manager import (
 )
 from db_models import DBManager
 
-# 새로 추가된 유틸리티 모듈 임포트
-from vectorstore_utils import (
-    process_documents, 
-    load_vectorstores, 
-    check_vectorstore_status
-)
-from rag_utils import (
-    create_rag_workflow,
-    generate_response
-)
+# 벡터 저장소/RAG 관련 모듈(faiss, langchain 등)은 로그인 후 실제로 필요할 때 임포트
 from ui_components import (
     add_fixed_header_style, 
     render_header, 
     render_fixed_tabs,
     render_document_stats,
     render_document_list,
+    render_category_filter,
     render_file_uploader,
     render_performance_tips
 )
 
-# langsmith로 로깅 설정 (선택 사항)
-try:
-    from langchain_teddynote import logging
-    logging.langsmith("llm_rag_prototype")
-except ImportError:
-    print("langchain_teddynote 라이브러리를 설치하지 않았습니다. 로깅 기능이 비활성화됩니다.")
+@st.cache_resource(show_spinner=False)
+def setup_optional_integrations():
+    """선택 라이브러리 설정 - 로그인 후 RAG 기능을 처음 사용할 때 프로세스당 한 번만 실행"""
+    # langsmith로 로깅 설정 (선택 사항)
+    try:
+        from langchain_teddynote import logging
+        logging.langsmith("llm_rag_prototype")
+    except ImportError:
+        print("langchain_teddynote 라이브러리를 설치하지 않았습니다. 로깅 기능이 비활성화됩니다.")
 
-# SQLite 문제 해결을 위한 pysqlite3 설정 (필요시 활성화)
-try:
-    import pysqlite3
-    import sys
-    sys.modules['sqlite3'] = pysqlite3
-except ImportError:
-    print("pysqlite3 라이브러리를 설치하지 않았습니다. sqlite3 관련 문제가 발생할 수 있습니다.")
+    # SQLite 문제 해결을 위한 pysqlite3 설정 (필요시 활성화)
+    try:
+        import pysqlite3
+        import sys
+        sys.modules['sqlite3'] = pysqlite3
+    except ImportError:
+        print("pysqlite3 라이브러리를 설치하지 않았습니다. sqlite3 관련 문제가 발생할 수 있습니다.")
+    return True
 
-# API 키 설정 (환경 변수에서 로드)
-api_key = os.environ.get("OPENAI_API_KEY")
-anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-admin_pass = os.environ.get("ADMIN_PASS")
-user_pass = os.environ.get("USER_PASS")
+# API 키 설정 (캐시된 환경 변수 사용)
+api_key = env_config.api_key
+anthropic_api_key = env_config.anthropic_api_key
+admin_pass = env_config.admin_pass
+user_pass = env_config.user_pass
 
 # 임베딩 모델 선택 (세션 상태에서 가져오거나 기본값 사용)
 EMBEDDING_MODEL = st.session_state.get("EMBEDDING_MODEL", "text-embedding-3-small")
@@ -81,21 +87,37 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# 데이터베이스/관리자 객체는 모든 세션이 공유하는 싱글턴으로 생성 (세션마다 복사본을 만들지 않도록)
+@st.cache_resource(show_spinner=False)
+def get_db_manager():
+    """DBManager 생성 및 기본 계정 준비 - 실패 시 예외는 캐시되지 않으므로 다음 rerun에서 재시도"""
+    # DBManager 초기화
+    db_manager = DBManager()
+    print("DB 연결 성공, 기본 계정 생성 시작")
+
+    # 기본 관리자 및 사용자 계정 생성
+    db_manager.create_default_admin()
+    db_manager.create_default_user()
+    
+    return db_manager
+
+@st.cache_resource(show_spinner=False, hash_funcs={DBManager: id})
+def get_user_manager(db_manager):
+    """공유 사용자 관리자"""
+    return UserManager(db_manager=db_manager)
+
+@st.cache_resource(show_spinner=False, hash_funcs={DBManager: id})
+def get_document_manager(db_manager):
+    """공유 문서 관리자"""
+    return DocumentManager(DATA_DIR, db_manager)
+
 # 데이터베이스 연결 설정 (옵션)
 def setup_database_connector():
     """데이터베이스 연결 설정"""
     print("데이터베이스 연결 시도")
 
     try:
-        # DBManager 초기화
-        db_manager = DBManager()
-        print("DB 연결 성공, 기본 계정 생성 시작")
-
-        # 기본 관리자 및 사용자 계정 생성
-        db_manager.create_default_admin()
-        db_manager.create_default_user()
-        
-        return db_manager
+        return get_db_manager()
     except Exception as e:
         st.warning(f"데이터베이스 연결 실패: {str(e)}. 세션 기반 저장소를 사용합니다.")
         return None
@@ -103,42 +125,48 @@ def setup_database_connector():
 # 앱 초기화 함수
 def initialize_app():
     """앱 초기화 및 세션 상태 설정"""
-    # 데이터베이스 연결은 한 번만 설정
+    # 고정 헤더/탭 스타일 추가 (캐시된 CSS 주입)
+    add_fixed_header_style()
+    
+    # 데이터베이스 연결은 세션당 한 번만 시도 (연결 객체 자체는 모든 세션이 공유)
     if "db_manager" not in st.session_state:
         print("앱 초기화 시작")
-        db_manager = setup_database_connector()
-        st.session_state.db_manager = db_manager
-    else:
-        db_manager = st.session_state.db_manager
+        st.session_state.db_manager = setup_database_connector()
+    db_manager = st.session_state.db_manager
     
-    # 사용자 관리자 초기화
-    if "user_manager" not in st.session_state:
-        st.session_state.user_manager = UserManager(db_manager=db_manager)
-    
-    # 문서 관리자 초기화
-    if "document_manager" not in st.session_state:
-        st.session_state.document_manager = DocumentManager(DATA_DIR, db_manager)
+    # 사용자/문서 관리자는 캐시된 공유 객체 사용
+    st.session_state.user_manager = get_user_manager(db_manager)
+    st.session_state.document_manager = get_document_manager(db_manager)
     
     # 대화 관리자 초기화
     if "conversation_manager" not in st.session_state:
         st.session_state.conversation_manager = ConversationManager(db_manager)
     
-            # 벡터 저장소 로드 - 로그인 후에만 필요
+    # 벡터 저장소 로드 - 로그인 후에만 필요
     if "vectorstore" not in st.session_state and st.session_state.get("authentication_status") == True:
+        setup_optional_integrations()
+        from vectorstore_utils import load_vectorstores, set_session_vectorstore
+        
         document_manager = st.session_state.document_manager
-        st.session_state.vectorstore = load_vectorstores(
-            document_manager,  # _document_manager로 전달됨
+        set_session_vectorstore(load_vectorstores(
+            document_manager,
             EMBEDDING_MODEL,
             api_key
-        )
-        
-        # RAG 워크플로우 생성 (벡터스토어가 있는 경우에만)
-        if st.session_state.vectorstore:
-            st.session_state.rag_workflow = create_rag_workflow()
+        ))
 
 # 메인 앱 실행
 def main():
-    """메인 앱 함수"""
+    """메인 앱 함수 - 실행이 끝나면 이번 실행 스레드의 DB 세션을 반납"""
+    try:
+        render_app()
+    finally:
+        # Streamlit은 rerun마다 새 스레드에서 실행하므로 스레드별 세션을 닫아 연결을 풀에 돌려줌
+        db_manager = st.session_state.get("db_manager")
+        if db_manager is not None:
+            db_manager.close_session()
+
+def render_app():
+    """앱 화면 구성"""
     # 성능 팁 페이지 (URL 파라미터로 접근)
     params = st.query_params
     if "tips" in params:
@@ -160,9 +188,6 @@ def main():
     # 앱 초기화
     initialize_app()
     
-    # 고정 헤더용 스타일 추가
-    add_fixed_header_style()
-    
     # 사용자 인증 상태 확인
     if "authentication_status" not in st.session_state:
         st.session_state["authentication_status"] = None  # None으로 초기화
@@ -185,6 +210,12 @@ def main():
     
     # 로그인 상태인 경우 메인 인터페이스 표시
     if st.session_state.get("authentication_status") == True:
+        # RAG 관련 모듈은 로그인 후에만 임포트 (로그인 화면 콜드 스타트 단축)
+        setup_optional_integrations()
+        from vectorstore_utils import process_documents, set_session_vectorstore
+        from rag_utils import generate_response_stream, get_question_embedding, ERROR_RESPONSES
+        from semantic_cache import ExactCache, get_semantic_cache
+        
         # 현재 사용자 정보
         username = st.session_state["username"]
         name = st.session_state["name"]
@@ -216,6 +247,14 @@ def main():
                 if "document_manager" in st.session_state:
                     render_document_list(st.session_state.document_manager)
             
+            # 검색 범위를 특정 카테고리로 제한 (문서가 있을 때만)
+            category_filter = None
+            if st.session_state.get("vectorstore") is not None:
+                category_filter = render_category_filter(st.session_state.get("document_manager"))
+            
+            # 민감한 질문은 응답 캐시를 사용하지 않도록 선택
+            no_cache = st.checkbox("응답 캐시 사용 안 함", key="no_cache_key")
+            
             # 사이드바 - 대화 목록 영역
             current_conv_id = editable_conversation_list(
                 st.session_state.conversation_manager, 
@@ -246,11 +285,17 @@ def main():
                         )
                         
                         if vectorstore:
-                            st.session_state.vectorstore = vectorstore
-                            # LangGraph 워크플로우 생성
-                            st.session_state.rag_workflow = create_rag_workflow()
+                            set_session_vectorstore(vectorstore)
                             st.success("문서가 성공적으로 처리되었습니다.")
                             
+                            # 사용 통계 기록 (버퍼에 추가만 하고 DB 기록은 백그라운드에서 처리)
+                            if st.session_state.db_manager:
+                                for file in file_info:
+                                    st.session_state.db_manager.log_usage(
+                                        username, "document_upload", file["doc_id"],
+                                        {"category": selected_category, "chunks": file["chunks"]}
+                                    )
+                            
                             # 처리된 파일 정보 표시
                             if file_info:
                                 st.subheader("처리된 파일")
@@ -264,9 +309,48 @@ def main():
             # conversation_manager를 명시적으로 전달
             conv_manager = st.session_state.conversation_manager
             
-            # generate_response에 대한 래퍼 함수 생성
+            # generate_response_stream에 대한 래퍼 함수 생성
             def response_wrapper(prompt, username, conversation_id):
-                return generate_response(prompt, username, conversation_id, _conv_manager=conv_manager)
+                stream = generate_response_stream(
+                    prompt, username, conversation_id,
+                    _conv_manager=conv_manager,
+                    category=category_filter
+                )
+                if no_cache:
+                    return stream
+                
+                # 완전 일치 캐시 - 같은 대화에서 같은 질문을 반복하면 임베딩 없이 바로 재사용
+                # (문서 구성은 청크 수가 아닌 인덱스의 문서 구성 해시로 구분)
+                doc_set_hash = st.session_state.get("vectorstore_doc_set_hash")
+                exact_cache = st.session_state.setdefault("exact_cache", ExactCache())
+                exact_key = ExactCache.make_key(conversation_id, category_filter, doc_set_hash, prompt)
+                cached_response = exact_cache.get(exact_key)
+                if cached_response is not None:
+                    return iter([cached_response])
+                
+                # 의미 캐시 - 사용자/검색 범위/문서 구성이 같고 비슷한 질문이면 이전 응답 재사용
+                # 문서 검색(RAG) 응답에만 사용하며 (문서가 없으면 임베딩 호출을 추가하지 않음),
+                # 이전 대화 맥락에 따라 답이 달라지는 후속 질문은 다른 대화의 응답을 받지 않도록 제외
+                vectorstore = st.session_state.get("vectorstore")
+                if vectorstore is None or conv_manager.get_conversation_messages(username, conversation_id):
+                    return exact_cache.cache_stream(exact_key, stream, exclude=ERROR_RESPONSES)
+                
+                try:
+                    # 검색에 사용하는 것과 같은 캐시된 질문 임베딩 (추가 API 호출 없음)
+                    query_vector = get_question_embedding(prompt, vectorstore.embeddings)
+                except Exception as e:
+                    print(f"질문 임베딩 실패, 캐시 없이 응답 생성: {str(e)}")
+                    return exact_cache.cache_stream(exact_key, stream, exclude=ERROR_RESPONSES)
+                
+                semantic_cache = get_semantic_cache()
+                namespace = (username, category_filter, doc_set_hash)
+                cached_response = semantic_cache.lookup(namespace, query_vector)
+                if cached_response is not None:
+                    exact_cache.put(exact_key, cached_response)
+                    return iter([cached_response])
+                
+                stream = semantic_cache.cache_stream(namespace, query_vector, prompt, stream, exclude=ERROR_RESPONSES)
+                return exact_cache.cache_stream(exact_key, stream, exclude=ERROR_RESPONSES)
             
             chat_interface(
                 conv_manager,
@@ -1,11 +1,51 @@
 # conversation_manager.py
 import streamlit as st
-import pandas as pd
 import uuid
+import itertools
 import time
+from collections import defaultdict
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from db_models import UserConversation, ConversationMessage
+
+# 화면에 시각을 표시할 때 사용하는 형식 (저장/캐시에는 datetime 그대로 보관)
+_TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# 대화 목록/메시지가 변경될 때마다 증가하는 버전 번호 (조회 캐시 무효화용, 모든 세션 공유)
+_conversation_list_version = 0
+_message_versions: Dict[str, int] = defaultdict(int)
+
+def _bump_conversation_list_version():
+    """대화 목록 조회 캐시 무효화"""
+    global _conversation_list_version
+    _conversation_list_version += 1
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_user_conversations(username: str, version: int, _db_manager) -> List[Dict[str, Any]]:
+    """사용자 대화 목록 캐싱 - rerun마다 DB를 조회하지 않도록 목록 버전별로 재사용"""
+    conversations = _db_manager.get_user_conversations(username)
+    return [
+        {
+            "conversation_id": conv.conversation_id,
+            "title": conv.title,
+            "created_at": conv.created_at,
+            "updated_at": conv.updated_at,
+            "is_archived": conv.is_archived
+        }
+        for conv in conversations
+    ]
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_conversation_messages(conversation_id: str, version: int, _db_manager) -> List[Dict[str, Any]]:
+    """대화 메시지 캐싱 - 메시지가 추가될 때만 다시 조회"""
+    messages = _db_manager.get_conversation_messages(conversation_id)
+    return [
+        {
+            "role": msg.role,
+            "content": msg.content,
+            "timestamp": msg.timestamp
+        }
+        for msg in messages
+    ]
 
 class ConversationManager:
     """대화 관리 클래스: 대화 생성, 메시지 추가, 대화 목록 조회 등 기능 제공"""
@@ -22,13 +62,13 @@ class ConversationManager:
     def create_conversation(self, username: str, title: str = None) -> str:
         """새 대화 생성"""
         conversation_id = str(uuid.uuid4())
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        current_time = datetime.now()
         
-        # 대화 데이터 생성
+        # 대화 데이터 생성 (시각은 datetime으로 저장하고 기본 제목에만 형식 적용)
         conversation_data = {
             "conversation_id": conversation_id,
             "username": username,
-            "title": title or f"새 대화 {current_time}",
+            "title": title or f"새 대화 {current_time.strftime(_TS_FMT)}",
             "created_at": current_time,
             "updated_at": current_time,
             "is_archived": False
@@ -37,62 +77,75 @@ class ConversationManager:
         if self.db_manager:
             try:
                 self.db_manager.add_conversation(conversation_data)
+                _bump_conversation_list_version()
             except Exception as e:
                 print(f"대화 생성 중 오류 발생: {str(e)}")
         
         # 세션 상태에 저장
         st.session_state.conversations[conversation_id] = {
             "messages": [],
-            "title": conversation_data["title"]
+            "title": conversation_data["title"],
+            "created_at": current_time,
+            "updated_at": current_time
         }
         
         return conversation_id
     
     def add_message(self, conversation_id: str, role: str, content: str) -> bool:
         """대화에 메시지 추가"""
+        return self.add_messages(conversation_id, [{"role": role, "content": content}])
+    
+    def add_messages(self, conversation_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """대화에 여러 메시지를 한 번에 추가 (DB 왕복/커밋 1회)
+        
+        각 메시지는 role, content와 선택적으로 timestamp(datetime)를 가진다.
+        """
         if conversation_id not in st.session_state.conversations:
             return False
         
-        message_id = str(uuid.uuid4())
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        current_time = datetime.now()
         
         # 메시지 데이터 생성
-        message_data = {
-            "message_id": message_id,
-            "conversation_id": conversation_id,
-            "role": role,
-            "content": content,
-            "timestamp": current_time
-        }
+        messages_data = [
+            {
+                "message_id": str(uuid.uuid4()),
+                "conversation_id": conversation_id,
+                "role": message["role"],
+                "content": message["content"],
+                "timestamp": message.get("timestamp") or current_time
+            }
+            for message in messages
+        ]
         
         if self.db_manager:
             try:
-                self.db_manager.add_message(message_data)
+                self.db_manager.add_messages(messages_data)
+                _message_versions[conversation_id] += 1
             except Exception as e:
                 print(f"메시지 추가 중 오류 발생: {str(e)}")
+                self.db_manager.session.rollback()
         
-        # 세션 상태에 저장
-        st.session_state.conversations[conversation_id]["messages"].append({
-            "role": role,
-            "content": content,
-            "timestamp": current_time
-        })
+        # 세션 상태에 저장 (시각은 표시할 때만 형식 적용)
+        conversation = st.session_state.conversations[conversation_id]
+        conversation["messages"].extend(
+            {
+                "role": message_data["role"],
+                "content": message_data["content"],
+                "timestamp": message_data["timestamp"]
+            }
+            for message_data in messages_data
+        )
+        conversation["updated_at"] = current_time
         
         return True
     
-    def get_conversation_messages(self, username: str, conversation_id: str) -> List[Dict[str, str]]:
+    def get_conversation_messages(self, username: str, conversation_id: str) -> List[Dict[str, Any]]:
         """대화 메시지 조회"""
         if self.db_manager:
             try:
-                messages = self.db_manager.get_conversation_messages(conversation_id)
-                return [
-                    {
-                        "role": msg.role,
-                        "content": msg.content,
-                        "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    for msg in messages
-                ]
+                return _cached_conversation_messages(
+                    conversation_id, _message_versions[conversation_id], self.db_manager
+                )
             except Exception as e:
                 print(f"대화 메시지 조회 중 오류 발생: {str(e)}")
         
@@ -103,17 +156,7 @@ class ConversationManager:
         """사용자의 대화 목록 조회"""
         if self.db_manager:
             try:
-                conversations = self.db_manager.get_user_conversations(username)
-                return [
-                    {
-                        "conversation_id": conv.conversation_id,
-                        "title": conv.title,
-                        "created_at": conv.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                        "updated_at": conv.updated_at.strftime("%Y-%m-%d %H:%M:%S"),
-                        "is_archived": conv.is_archived
-                    }
-                    for conv in conversations
-                ]
+                return _cached_user_conversations(username, _conversation_list_version, self.db_manager)
             except Exception as e:
                 print(f"대화 목록 조회 중 오류 발생: {str(e)}")
         
@@ -122,8 +165,8 @@ class ConversationManager:
             {
                 "conversation_id": conv_id,
                 "title": conv_data["title"],
-                "created_at": conv_data.get("created_at", ""),
-                "updated_at": conv_data.get("updated_at", ""),
+                "created_at": conv_data.get("created_at", datetime.min),
+                "updated_at": conv_data.get("updated_at", datetime.min),
                 "is_archived": conv_data.get("is_archived", False)
             }
             for conv_id, conv_data in st.session_state.conversations.items()
@@ -133,7 +176,9 @@ class ConversationManager:
         """대화 제목 업데이트"""
         if self.db_manager:
             try:
-                return self.db_manager.update_conversation_title(conversation_id, new_title)
+                updated = self.db_manager.update_conversation_title(conversation_id, new_title)
+                _bump_conversation_list_version()
+                return updated
             except Exception as e:
                 print(f"대화 제목 업데이트 중 오류 발생: {str(e)}")
         
@@ -145,38 +190,121 @@ class ConversationManager:
     
     def archive_conversation(self, conversation_id: str) -> bool:
         """대화 아카이브"""
+        return self.archive_conversations([conversation_id]) > 0
+    
+    def archive_conversations(self, conversation_ids: List[str]) -> int:
+        """여러 대화를 한 번에 아카이브 (DB 왕복/커밋 1회) - 아카이브된 대화 수 반환"""
         if self.db_manager:
             try:
-                conversation = self.db_manager.session.query(UserConversation).filter(
-                    UserConversation.conversation_id == conversation_id
-                ).first()
-                
-                if conversation:
-                    conversation.is_archived = True
-                    conversation.updated_at = datetime.now()
-                    self.db_manager.session.commit()
-                    return True
+                archived = self.db_manager.archive_conversations(conversation_ids)
+                _bump_conversation_list_version()
+                if archived:
+                    return archived
             except Exception as e:
                 print(f"대화 아카이브 중 오류 발생: {str(e)}")
+                self.db_manager.session.rollback()
         
         # DB가 없는 경우 세션 상태 업데이트
-        if conversation_id in st.session_state.conversations:
-            st.session_state.conversations[conversation_id]["is_archived"] = True
-            return True
-        return False
+        archived = 0
+        for conversation_id in conversation_ids:
+            if conversation_id in st.session_state.conversations:
+                st.session_state.conversations[conversation_id]["is_archived"] = True
+                archived += 1
+        return archived
+
+# 사이드바에 바로 표시할 최근 대화 수 (나머지는 "이전 대화"를 펼쳤을 때만 표시)
+RECENT_CONVERSATION_LIMIT = 20
+
+def _render_conversation_row(container, conversation_manager, username, conv, current_conv_id, ordered_ids):
+    """대화 목록의 한 행(제목/편집/삭제 버튼) 표시"""
+    conv_id = conv["conversation_id"]
+    # 위젯 키는 짧은 ID로 생성 (rerun마다 비교하는 위젯 상태 키 크기 축소)
+    short_id = conv_id[:8]
+    col1, col2, col3 = container.columns([0.7, 0.15, 0.15])
+    
+    # 편집 모드 상태에 따라 표시 방식 변경
+    if st.session_state.edit_mode_conversation == conv_id:
+        # 편집 모드
+        with col1:
+            new_title = st.text_input(
+                "대화명 편집",
+                value=conv["title"],
+                key=f"edit_title_{short_id}"
+            )
+        
+        with col2:
+            if st.button("✓", key=f"save_{short_id}"):
+                conversation_manager.update_conversation_title(conv_id, new_title)
+                st.session_state.edit_mode_conversation = None
+                st.rerun()
+        
+        with col3:
+            if st.button("✕", key=f"cancel_{short_id}"):
+                st.session_state.edit_mode_conversation = None
+                st.rerun()
+        return
+    
+    # 일반 모드
+    with col1:
+        # 현재 선택된 대화는 강조 표시
+        label = f"**{conv['title']}**" if conv_id == current_conv_id else f"{conv['title']}"
+        if st.button(label, key=f"conv_{short_id}"):
+            st.session_state[f"current_conversation_id_{username}"] = conv_id
+            st.rerun()
+    
+    with col2:
+        # 편집 버튼
+        if st.button("✏️", key=f"edit_{short_id}"):
+            st.session_state.edit_mode_conversation = conv_id
+            st.rerun()
+    
+    with col3:
+        # 삭제(보관) 버튼
+        if st.button("🗑️", key=f"delete_{short_id}"):
+            # 삭제 확인을 위한 상태 관리
+            if "delete_confirm" not in st.session_state:
+                st.session_state.delete_confirm = None
+            
+            if st.session_state.delete_confirm == conv_id:
+                # 삭제 확인
+                conversation_manager.archive_conversation(conv_id)
+                
+                # 현재 선택된 대화가 삭제되는 경우 다른 대화 선택
+                if current_conv_id == conv_id and ordered_ids:
+                    # 다른 대화가 있으면 첫 번째 대화 선택 (전체 목록을 복사하지 않고 첫 항목만 탐색)
+                    fallback_id = next((cid for cid in ordered_ids if cid != conv_id), None)
+                    if fallback_id:
+                        st.session_state[f"current_conversation_id_{username}"] = fallback_id
+                    else:
+                        # 다른 대화가 없으면 새 대화 생성
+                        new_id = conversation_manager.create_conversation(username)
+                        st.session_state[f"current_conversation_id_{username}"] = new_id
+                
+                st.session_state.delete_confirm = None
+                st.rerun()
+            else:
+                # 삭제 확인 요청
+                st.session_state.delete_confirm = conv_id
+                container.warning(f"'{conv['title']}' 대화를 삭제하시겠습니까? 다시 클릭하면 삭제됩니다.")
 
 # UI 컴포넌트: 편집 가능한 대화 목록
 def editable_conversation_list(conversation_manager, username):
-    """편집 가능한 대화 목록 컴포넌트"""
+    """편집 가능한 대화 목록 컴포넌트 (최근 대화만 바로 표시하고 나머지는 펼쳤을 때만 표시)"""
     st.sidebar.title("대화 목록")
     
-    # 사용자별 대화 목록 관리
-    conversations = conversation_manager.get_user_conversations(username)
+    # 사용자별 대화 목록 관리 - 보관된 대화는 제외하고 최근 수정 순으로 정렬
+    conversations = sorted(
+        (conv for conv in conversation_manager.get_user_conversations(username) if not conv["is_archived"]),
+        key=lambda conv: conv["updated_at"],
+        reverse=True
+    )
+    # 정렬된 ID 목록은 rerun당 한 번만 계산해 모든 행에서 재사용
+    ordered_ids = [conv["conversation_id"] for conv in conversations]
     
     # 현재 대화 상태 관리
     if f"current_conversation_id_{username}" not in st.session_state:
         if conversations:
-            st.session_state[f"current_conversation_id_{username}"] = conversations[0]["conversation_id"]
+            st.session_state[f"current_conversation_id_{username}"] = ordered_ids[0]
         else:
             # 대화가 없으면 새 대화 생성
             new_id = conversation_manager.create_conversation(username)
@@ -197,77 +325,22 @@ def editable_conversation_list(conversation_manager, username):
     if "edit_mode_conversation" not in st.session_state:
         st.session_state.edit_mode_conversation = None
     
-    # 대화 목록 표시
-    for conv in conversations:
-        col1, col2, col3 = st.sidebar.columns([0.7, 0.15, 0.15])
-        
-        # 편집 모드 상태에 따라 표시 방식 변경
-        if st.session_state.edit_mode_conversation == conv["conversation_id"]:
-            # 편집 모드
-            with col1:
-                new_title = st.text_input(
-                    "대화명 편집",
-                    value=conv["title"],
-                    key=f"edit_title_{conv['conversation_id']}"
-                )
-            
-            with col2:
-                if st.button("✓", key=f"save_{conv['conversation_id']}"):
-                    conversation_manager.update_conversation_title(conv["conversation_id"], new_title)
-                    st.session_state.edit_mode_conversation = None
-                    st.rerun()
-            
-            with col3:
-                if st.button("✕", key=f"cancel_{conv['conversation_id']}"):
-                    st.session_state.edit_mode_conversation = None
-                    st.rerun()
-        else:
-            # 일반 모드
-            with col1:
-                # 현재 선택된 대화는 강조 표시
-                if conv["conversation_id"] == current_conv_id:
-                    if st.button(f"**{conv['title']}**", key=f"conv_{conv['conversation_id']}"):
-                        st.session_state[f"current_conversation_id_{username}"] = conv["conversation_id"]
-                        st.rerun()
-                else:
-                    if st.button(f"{conv['title']}", key=f"conv_{conv['conversation_id']}"):
-                        st.session_state[f"current_conversation_id_{username}"] = conv["conversation_id"]
-                        st.rerun()
-            
-            with col2:
-                # 편집 버튼
-                if st.button("✏️", key=f"edit_{conv['conversation_id']}"):
-                    st.session_state.edit_mode_conversation = conv["conversation_id"]
-                    st.rerun()
-            
-            with col3:
-                # 삭제(보관) 버튼
-                if st.button("🗑️", key=f"delete_{conv['conversation_id']}"):
-                    # 삭제 확인을 위한 상태 관리
-                    if "delete_confirm" not in st.session_state:
-                        st.session_state.delete_confirm = None
-                    
-                    if st.session_state.delete_confirm == conv["conversation_id"]:
-                        # 삭제 확인
-                        conversation_manager.archive_conversation(conv["conversation_id"])
-                        
-                        # 현재 선택된 대화가 삭제되는 경우 다른 대화 선택
-                        if current_conv_id == conv["conversation_id"] and conversations:
-                            # 다른 대화가 있으면 첫 번째 대화 선택
-                            other_convs = [c for c in conversations if c["conversation_id"] != conv["conversation_id"]]
-                            if other_convs:
-                                st.session_state[f"current_conversation_id_{username}"] = other_convs[0]["conversation_id"]
-                            else:
-                                # 다른 대화가 없으면 새 대화 생성
-                                new_id = conversation_manager.create_conversation(username)
-                                st.session_state[f"current_conversation_id_{username}"] = new_id
-                        
-                        st.session_state.delete_confirm = None
-                        st.rerun()
-                    else:
-                        # 삭제 확인 요청
-                        st.session_state.delete_confirm = conv["conversation_id"]
-                        st.sidebar.warning(f"'{conv['title']}' 대화를 삭제하시겠습니까? 다시 클릭하면 삭제됩니다.")
+    # 최근 대화 목록 표시
+    recent_conversations = conversations[:RECENT_CONVERSATION_LIMIT]
+    older_conversations = conversations[RECENT_CONVERSATION_LIMIT:]
+    
+    for conv in recent_conversations:
+        _render_conversation_row(st.sidebar, conversation_manager, username, conv, current_conv_id, ordered_ids)
+    
+    # 이전 대화는 펼쳤을 때만 위젯 생성 (st.expander는 접혀 있어도 내용을 모두 렌더링하므로 체크박스로 제어)
+    # 선택/편집 중인 대화가 이전 대화에 있으면 항상 표시
+    if older_conversations:
+        older_ids = set(ordered_ids[RECENT_CONVERSATION_LIMIT:])
+        has_active = current_conv_id in older_ids or st.session_state.edit_mode_conversation in older_ids
+        show_older = st.sidebar.checkbox(f"이전 대화 ({len(older_conversations)})", key="show_older_conversations")
+        if show_older or has_active:
+            for conv in older_conversations:
+                _render_conversation_row(st.sidebar, conversation_manager, username, conv, current_conv_id, ordered_ids)
     
     # 구분선 추가
     st.sidebar.divider()
@@ -294,46 +367,55 @@ def chat_interface(conversation_manager, username, conversation_id, generate_res
     
     # 입력 처리
     if prompt:
-        # 사용자 메시지 추가
-        conversation_manager.add_message(conversation_id, "user", prompt)
+        # 사용자 메시지는 응답과 함께 한 번에 저장 (질문 시각은 지금 기록)
+        prompt_time = datetime.now()
         
         # 스크롤을 위해 메시지 컨테이너 다시 사용
         with message_container:
             with st.chat_message("user"):
                 st.markdown(prompt)
             
-            # 어시스턴트 응답
+            # 어시스턴트 응답 (생성되는 대로 토큰 단위로 표시)
             with st.chat_message("assistant"):
-                message_placeholder = st.empty()
+                from rag_utils import NEED_MORE_INFO
+                
+                # 추가 정보 필요 신호는 화면에 출력하지 않고 응답이 끝난 뒤 안내에 사용
+                need_more_info = False
+                
+                def text_chunks(chunks):
+                    nonlocal need_more_info
+                    for chunk in chunks:
+                        if chunk is NEED_MORE_INFO:
+                            need_more_info = True
+                        else:
+                            yield chunk
                 
+                stream = text_chunks(generate_response_func(prompt, username, conversation_id))
+                
+                # 스피너는 첫 토큰이 도착할 때까지만 표시
                 with st.spinner("응답 생성 중..."):
-                    # 응답 생성 함수 호출
-                    response = generate_response_func(prompt, username, conversation_id)
+                    first_chunk = next(stream, "")
+                
+                response = st.write_stream(itertools.chain([first_chunk], stream))
                 
-                message_placeholder.markdown(response)
+                if need_more_info:
+                    st.info(
+                        "업로드된 문서에서 충분한 정보를 찾지 못했습니다. "
+                        "질문을 더 구체적으로 바꾸거나 검색 범위(카테고리)를 넓혀 보시고, "
+                        "필요한 문서가 없다면 관리자에게 업로드를 요청하세요."
+                    )
         
-        # 어시스턴트 메시지 저장
-        conversation_manager.add_message(conversation_id, "assistant", response)
+        # 사용자 질문과 어시스턴트 응답 저장
+        conversation_manager.add_messages(conversation_id, [
+            {"role": "user", "content": prompt, "timestamp": prompt_time},
+            {"role": "assistant", "content": response}
+        ])
         
-        # 스크롤 최하단으로 이동하기 위한 JavaScript 실행
-        js_code = """
-        <script>
-            function scrollToBottom() {
-                const mainContainer = document.querySelector('.main');
-                if (mainContainer) {
-                    mainContainer.scrollTop = mainContainer.scrollHeight;
-                }
-            }
-            
-            // 페이지 로드 후 실행
-            window.addEventListener('load', scrollToBottom);
-            
-            // 약간의 지연을 두고 한 번 더 실행 (콘텐츠가 완전히 로드된 후)
-            setTimeout(scrollToBottom, 500);
-        </script>
-        """
-        
-        st.markdown(js_code, unsafe_allow_html=True)
+        # 사용 통계 기록 (버퍼에 추가만 하고 DB 기록은 백그라운드에서 처리)
+        if conversation_manager.db_manager:
+            conversation_manager.db_manager.log_usage(
+                username, "chat", conversation_id, {"prompt_chars": len(prompt)}
+            )
 
 # 문서 트리 컴포넌트
 def document_tree_view(doc_manager, selected_category=None):
@@ -433,16 +515,9 @@ def display_document_content(doc_manager, doc_id):
         vectorstore = st.session_state.vectorstore
         
         try:
-            # 벡터 저장소에서 문서 청크 검색 - 수정된 부분
-            # 메타데이터 검색을 위한 조건 수정
-            search_query = f"document: {doc_info['filename']}"
-            
-            # 필터링 조건으로 검색
-            docs = vectorstore.similarity_search(
-                search_query,
-                k=100,  # 더 많은 청크 검색
-                filter={"doc_id": doc_info['doc_id']}  # 문서 ID로 필터링
-            )
+            # 문서 ID별 청크 맵으로 직접 조회 (질문 임베딩/유사도 검색 없이 해당 문서의 모든 청크)
+            from vectorstore_utils import get_document_chunks
+            docs = get_document_chunks(vectorstore, doc_info['doc_id'])
             
             if docs:
                 # 청크들을 표시
@@ -454,29 +529,7 @@ def display_document_content(doc_manager, doc_id):
                         st.markdown(chunk.page_content)
                         st.divider()
             else:
-                # 필터가 작동하지 않는 경우 대체 검색 방법 시도
-                st.info("문서 ID 필터링으로 청크를 찾을 수 없습니다. 파일명으로 검색합니다.")
-                
-                # 파일명으로 검색 시도
-                docs = vectorstore.similarity_search(
-                    doc_info['filename'],
-                    k=100  # 더 많은 청크 검색
-                )
-                
-                # 검색 결과에서 해당 문서 ID를 가진 문서만 필터링
-                filtered_docs = [doc for doc in docs if doc.metadata.get('doc_id') == doc_info['doc_id']]
-                
-                if filtered_docs:
-                    # 청크들을 표시
-                    st.subheader("문서 내용 미리보기")
-                    
-                    with st.expander("문서 청크 보기", expanded=True):
-                        for i, chunk in enumerate(filtered_docs):
-                            st.markdown(f"**청크 {i+1}:**")
-                            st.markdown(chunk.page_content)
-                            st.divider()
-                else:
-                    st.info("이 문서의 내용을 찾을 수 없습니다. 문서가 제대로 임베딩되었는지 확인하세요.")
+                st.info("이 문서의 내용을 찾을 수 없습니다. 문서가 제대로 임베딩되었는지 확인하세요.")
                 
         except Exception as e:
             st.error(f"문서 청크 검색 중 오류가 발생했습니다: {str(e)}")
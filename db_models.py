@@ -10,15 +10,28 @@ from sqlalchemy import (
     DateTime, 
     ForeignKey, 
     JSON,
+    Index,
     func,
-    text
+    text,
+    insert,
+    update,
+    or_
 )
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, scoped_session
+import atexit
 import datetime
+import io
+import json
+import logging
 import os
+import threading
+from collections import deque
+import bcrypt
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # .env 파일 로드
 load_dotenv()
 
@@ -26,8 +39,26 @@ load_dotenv()
 required_vars = ["DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"]
 missing_vars = [var for var in required_vars if not os.environ.get(var)]
 if missing_vars:
-    print(f"경고: 다음 필수 환경 변수가 설정되지 않았습니다: {', '.join(missing_vars)}")
-    print("기본값을 사용하거나 오류가 발생할 수 있습니다.")
+    logger.warning("다음 필수 환경 변수가 설정되지 않았습니다: %s - 기본값을 사용하거나 오류가 발생할 수 있습니다.", ', '.join(missing_vars))
+
+# bcrypt 비용(라운드 수) - 서버 성능에 맞게 환경 변수로 조정 (기본값은 bcrypt 기본값과 같은 12)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+def hash_password(password):
+    """bcrypt로 비밀번호 해싱 (streamlit_authenticator Hasher와 같은 $2b$ 형식)"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+# 사용 통계는 메모리에 모았다가 주기적으로(또는 일정 건수마다) 한 번에 기록
+USAGE_FLUSH_INTERVAL = 2     # 초
+USAGE_FLUSH_BATCH_SIZE = 500
+
+# 이 행 수를 넘는 일괄 INSERT는 COPY로 적재 (그 이하는 execute_values)
+COPY_THRESHOLD = 100
+
+# 관계 지연 로딩 전략 - 현재 관계 속성을 읽는 코드가 없으므로 기본은 필요할 때만 조회(select)
+# ORM_RAISE_ON_LAZY_LOAD=1 (CI 등)이면 쿼리 옵션 없이 관계를 읽을 때 예외를 발생시켜 N+1 조회를 검출
+# (관계가 필요한 쿼리는 selectinload/joinedload 옵션으로 명시적으로 로드)
+RELATIONSHIP_LAZY = "raise_on_sql" if os.environ.get("ORM_RAISE_ON_LAZY_LOAD") == "1" else "select"
 
 # Base 클래스 생성
 Base = declarative_base()
@@ -46,15 +77,25 @@ class User(Base):
     last_login = Column(DateTime)
     
     # 관계 정의
-    documents = relationship("DocumentMetadata", back_populates="uploader")
-    conversations = relationship("UserConversation", back_populates="user")
-    permissions = relationship("CategoryPermission", back_populates="user", foreign_keys="CategoryPermission.username")
-    assigned_permissions = relationship("CategoryPermission", back_populates="assigner", foreign_keys="CategoryPermission.assigned_by")
+    documents = relationship("DocumentMetadata", back_populates="uploader", lazy=RELATIONSHIP_LAZY)
+    conversations = relationship("UserConversation", back_populates="user", lazy=RELATIONSHIP_LAZY)
+    permissions = relationship("CategoryPermission", back_populates="user", foreign_keys="CategoryPermission.username", lazy=RELATIONSHIP_LAZY)
+    assigned_permissions = relationship("CategoryPermission", back_populates="assigner", foreign_keys="CategoryPermission.assigned_by", lazy=RELATIONSHIP_LAZY)
 
 # 문서 메타데이터 테이블
 class DocumentMetadata(Base):
     __tablename__ = 'document_metadata'
-    __table_args__ = {'schema': 'public'}  # 스키마 명시
+    __table_args__ = (
+        # 업로드 시 동일 파일명의 최신 버전 조회용 인덱스
+        Index('ix_document_metadata_filename_category', 'filename', 'category'),
+        # 동일 내용 재업로드 확인용 인덱스
+        Index('ix_document_metadata_file_hash', 'file_hash'),
+        # 카테고리별 활성 문서 조회용 부분 인덱스 (활성 문서만 포함)
+        # 문서 탐색 화면의 페이지 조회는 파일명/버전 정렬까지 인덱스 순서로 처리하고,
+        # 카테고리 목록(DISTINCT category) 조회도 이 인덱스의 첫 컬럼을 사용
+        Index('ix_dm_cat_active_filename', 'category', 'filename', 'version', postgresql_where=text('is_active')),
+        {'schema': 'public'}  # 스키마 명시
+    )
     
     doc_id = Column(String(50), primary_key=True)
     filename = Column(String(255), nullable=False)
@@ -67,10 +108,11 @@ class DocumentMetadata(Base):
     is_active = Column(Boolean, default=True)
     vector_store_path = Column(String(255))
     description = Column(Text)
+    file_hash = Column(String(64))
     
     # 관계 정의
-    uploader = relationship("User", back_populates="documents")
-    version_logs = relationship("DocumentVersionLog", back_populates="document")
+    uploader = relationship("User", back_populates="documents", lazy=RELATIONSHIP_LAZY)
+    version_logs = relationship("DocumentVersionLog", back_populates="document", lazy=RELATIONSHIP_LAZY)
 
 # 카테고리 권한 테이블
 class CategoryPermission(Base):
@@ -86,13 +128,17 @@ class CategoryPermission(Base):
     assigned_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     
     # 관계 정의
-    user = relationship("User", back_populates="permissions", foreign_keys=[username])
-    assigner = relationship("User", back_populates="assigned_permissions", foreign_keys=[assigned_by])
+    user = relationship("User", back_populates="permissions", foreign_keys=[username], lazy=RELATIONSHIP_LAZY)
+    assigner = relationship("User", back_populates="assigned_permissions", foreign_keys=[assigned_by], lazy=RELATIONSHIP_LAZY)
 
 # 문서 버전 로그
 class DocumentVersionLog(Base):
     __tablename__ = 'document_version_log'
-    __table_args__ = {'schema': 'public'}  # 스키마 명시
+    __table_args__ = (
+        # 문서별 변경 기록을 최근 순으로 조회하는 인덱스 (역방향 스캔으로 changed_at DESC 처리)
+        Index('ix_dvl_doc_time', 'doc_id', 'changed_at'),
+        {'schema': 'public'}  # 스키마 명시
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     doc_id = Column(String(50), ForeignKey('public.document_metadata.doc_id'))
@@ -103,13 +149,18 @@ class DocumentVersionLog(Base):
     changed_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     
     # 관계 정의
-    document = relationship("DocumentMetadata", back_populates="version_logs")
-    changer = relationship("User")
+    document = relationship("DocumentMetadata", back_populates="version_logs", lazy=RELATIONSHIP_LAZY)
+    changer = relationship("User", lazy=RELATIONSHIP_LAZY)
 
 # 사용자 대화 테이블
 class UserConversation(Base):
     __tablename__ = 'user_conversations'
-    __table_args__ = {'schema': 'public'}  # 스키마 명시
+    __table_args__ = (
+        # 사용자별 대화 목록(보관 제외, 최근 수정 순) 조회용 인덱스
+        # (B-tree는 역방향 스캔이 가능하므로 updated_at DESC 정렬도 이 인덱스로 처리)
+        Index('ix_uc_user_archived_updated', 'username', 'is_archived', 'updated_at'),
+        {'schema': 'public'}  # 스키마 명시
+    )
     
     conversation_id = Column(String(50), primary_key=True)
     username = Column(String(100), ForeignKey('public.users.username'), nullable=False)
@@ -119,13 +170,17 @@ class UserConversation(Base):
     is_archived = Column(Boolean, default=False)
     
     # 관계 정의
-    user = relationship("User", back_populates="conversations")
-    messages = relationship("ConversationMessage", back_populates="conversation")
+    user = relationship("User", back_populates="conversations", lazy=RELATIONSHIP_LAZY)
+    messages = relationship("ConversationMessage", back_populates="conversation", lazy=RELATIONSHIP_LAZY)
 
 # 대화 메시지 테이블
 class ConversationMessage(Base):
     __tablename__ = 'conversation_messages'
-    __table_args__ = {'schema': 'public'}  # 스키마 명시
+    __table_args__ = (
+        # 대화별 메시지를 시간 순으로 조회하는 인덱스
+        Index('ix_cm_conv_ts', 'conversation_id', 'timestamp'),
+        {'schema': 'public'}  # 스키마 명시
+    )
     
     message_id = Column(String(50), primary_key=True)
     conversation_id = Column(String(50), ForeignKey('public.user_conversations.conversation_id'))
@@ -134,7 +189,7 @@ class ConversationMessage(Base):
     timestamp = Column(DateTime, nullable=False)
     
     # 관계 정의
-    conversation = relationship("UserConversation", back_populates="messages")
+    conversation = relationship("UserConversation", back_populates="messages", lazy=RELATIONSHIP_LAZY)
 
 # 사용 통계 테이블
 class UsageStat(Base):
@@ -149,12 +204,12 @@ class UsageStat(Base):
     details = Column(JSON)
     
     # 관계 정의
-    user = relationship("User")
+    user = relationship("User", lazy=RELATIONSHIP_LAZY)
 
 # 데이터베이스 연결 및 초기화 함수
 def init_db():
-    print("init_db 시작")
     """PostgreSQL 데이터베이스 연결 및 테이블 초기화"""
+    logger.debug("init_db 시작")
     db_host = os.environ.get("DB_HOST")
     db_port = os.environ.get("DB_PORT")
     db_name = os.environ.get("DB_NAME")
@@ -166,44 +221,123 @@ def init_db():
     
     # 엔진 생성
     # print(f"DB URL: {db_url}로 엔진 생성")
-    engine = create_engine(db_url)
-    
-    # 세션 생성
-    print("세션 생성 성공")
+    # executemany 최적화: INSERT는 여러 행을 하나의 VALUES 문으로 묶고(insertmanyvalues),
+    # UPDATE/DELETE 같은 나머지 executemany는 psycopg2 execute_batch로 묶어 전송
+    # (session.execute(insert(Model), [dict, ...]) / bulk 연산이 자동으로 혜택을 받음)
+    # 연결 풀: 여러 Streamlit 세션이 동시에 사용하므로 풀 크기를 늘리고,
+    # 끊어진 연결은 사용 전 확인(pre-ping)/주기적 재생성으로 걸러냄
+    engine = create_engine(
+        db_url,
+        executemany_mode="values_plus_batch",
+        insertmanyvalues_page_size=1000,
+        executemany_batch_page_size=500,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        # 연결마다 SET search_path를 실행하지 않도록 접속 옵션으로 지정
+        connect_args={"options": "-c search_path=public"}
+    )
+    
+    # 세션 생성 - DBManager를 모든 Streamlit 세션이 공유하므로 스레드별 세션 사용
+    logger.debug("세션 생성 성공")
     Session = sessionmaker(bind=engine)
-    session = Session()
+    session = scoped_session(Session)
     
     try:
         # public 스키마가 없으면 생성
         session.execute(text("CREATE SCHEMA IF NOT EXISTS public"))
-        session.execute(text("SET search_path TO public"))
         session.commit()
         
         # 테이블 생성 (순서 중요)
         # Base.metadata.drop_all(engine)  # 기존 테이블 삭제
         Base.metadata.create_all(engine)  # 새 테이블 생성
         
+        # 기존 테이블에 새로 추가된 컬럼 반영 (create_all은 기존 테이블을 변경하지 않음)
+        session.execute(text(
+            "ALTER TABLE public.document_metadata ADD COLUMN IF NOT EXISTS file_hash VARCHAR(64)"
+        ))
+        session.commit()
+        
+        create_missing_indexes(engine)
+        
         return engine, session
     except Exception as e:
         session.rollback()
         raise e
 
+def create_trigram_index(engine):
+    """파일명/설명 부분 일치(ILIKE) 검색용 트라이그램 GIN 인덱스 생성
+    
+    pg_trgm 확장을 만들 권한이 없으면 경고만 남기고 건너뛴다 (검색은 인덱스 없이 동작).
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_dm_fn_trgm ON public.document_metadata "
+                "USING gin (filename gin_trgm_ops, description gin_trgm_ops)"
+            ))
+        return True
+    except Exception as e:
+        logger.warning("트라이그램 인덱스 생성 실패 - ILIKE 검색은 인덱스 없이 동작: %s", e)
+        return False
+
+# 다른 인덱스로 대체되어 더 이상 사용하지 않는 인덱스 (쓰기 비용만 늘리므로 제거)
+OBSOLETE_INDEXES = (
+    "ix_dm_cat_active",                 # ix_dm_cat_active_filename이 같은 조회를 처리
+    "idx_docmeta_cat_active_filename",  # ix_ 접두사로 이름 변경
+    "idx_versionlog_doc_time",
+    "idx_docmeta_fn_trgm",
+)
+
+def create_missing_indexes(engine):
+    """기존 테이블에 새로 정의된 인덱스 생성 (create_all은 이미 있는 테이블의 인덱스를 추가하지 않음)"""
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS public.{name}"))
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    
+    # 문서 검색(ILIKE)용 트라이그램 인덱스
+    create_trigram_index(engine)
+
 # 데이터베이스 관리 클래스
 class DBManager:
     """데이터베이스 관리 클래스"""
     
     def __init__(self, engine=None, session=None):
-        print("DBManager 초기화 시작")
+        logger.debug("DBManager 초기화 시작")
         if engine is None or session is None:
             self.engine, self.session = init_db()
         else:
             self.engine = engine
             self.session = session
+        
+        # 사용 통계 버퍼 (백그라운드 스레드가 일괄 기록)
+        self._usage_buffer = deque()
+        self._usage_flush_event = threading.Event()
+        self._usage_flush_lock = threading.Lock()
+        self._usage_flusher = None
+    
+    def close_session(self):
+        """현재 스레드의 세션을 닫고 연결을 풀에 반납 (작업 단위가 끝날 때 호출)"""
+        remove = getattr(self.session, "remove", None)
+        if remove is not None:
+            remove()
+        else:
+            self.session.close()
+    
+    def user_exists(self, username):
+        """사용자 존재 여부 확인 (행을 불러오지 않고 EXISTS 조회)"""
+        exists_query = self.session.query(User.username).filter(User.username == username).exists()
+        return self.session.query(exists_query).scalar()
     
     def create_default_admin(self):
         """환경 변수에서 정보를 가져와 기본 관리자 계정 생성"""
-        from streamlit_authenticator import Hasher
-        
         # 환경 변수에서 관리자 정보 가져오기
         admin_username = os.environ.get("ADMIN_USERNAME")
         admin_password = os.environ.get("ADMIN_PASS")
@@ -211,17 +345,15 @@ class DBManager:
         admin_email = os.environ.get("ADMIN_EMAIL")
         
         if not admin_password:
-            print("경고: ADMIN_PASS 환경 변수가 설정되지 않았습니다!")
+            logger.warning("ADMIN_PASS 환경 변수가 설정되지 않았습니다!")
             return False
         
         # 이미 존재하는지 확인
-        existing_user = self.session.query(User).filter(User.username == admin_username).first()
-        if existing_user:
+        if self.user_exists(admin_username):
             return False
         
         # 비밀번호 해시 생성
-        hasher = Hasher()
-        password_hash = hasher.hash(admin_password)
+        password_hash = hash_password(admin_password)
         
         # 관리자 계정 생성
         admin = User(
@@ -239,8 +371,6 @@ class DBManager:
     
     def create_default_user(self):
         """환경 변수에서 정보를 가져와 기본 사용자 계정 생성"""
-        from streamlit_authenticator import Hasher
-        
         # 환경 변수에서 사용자 정보 가져오기
         user_username = os.environ.get("USER_USERNAME")
         user_password = os.environ.get("USER_PASS")
@@ -248,17 +378,15 @@ class DBManager:
         user_email = os.environ.get("USER_EMAIL")
         
         if not user_password:
-            print("경고: USER_PASS 환경 변수가 설정되지 않았습니다!")
+            logger.warning("USER_PASS 환경 변수가 설정되지 않았습니다!")
             return False
         
         # 이미 존재하는지 확인
-        existing_user = self.session.query(User).filter(User.username == user_username).first()
-        if existing_user:
+        if self.user_exists(user_username):
             return False
         
-            # 비밀번호 해시 생성
-        hasher = Hasher()
-        password_hash = hasher.hash(user_password) 
+        # 비밀번호 해시 생성
+        password_hash = hash_password(user_password)
         
         # 사용자 계정 생성
         user = User(
@@ -278,30 +406,122 @@ class DBManager:
         """모든 사용자 조회"""
         return self.session.query(User).all()
     
+    def insert_many(self, model, rows):
+        """여러 행을 한 번에 INSERT (커밋은 호출자가 수행)
+        
+        ORM 객체/작업 단위(identity map, 변경 추적)를 거치지 않는 Core insert로 실행하며,
+        엔진의 insertmanyvalues 설정에 따라 1000행씩 하나의 INSERT ... VALUES 문으로 묶인다.
+        COPY_THRESHOLD를 넘는 대량 적재는 copy_insert(COPY)로 처리한다.
+        모든 행은 같은 키를 가져야 한다.
+        """
+        if not rows:
+            return 0
+        if len(rows) > COPY_THRESHOLD:
+            return self.copy_insert(model, rows)
+        
+        self.session.execute(insert(model.__table__), rows)
+        return len(rows)
+    
+    @staticmethod
+    def _copy_value(value, is_json=False):
+        """COPY 텍스트 형식 필드로 변환 (NULL은 \\N, 구분자/개행/백슬래시는 이스케이프)"""
+        if value is None:
+            return "\\N"
+        if is_json:
+            value = json.dumps(value, ensure_ascii=False)
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    
+    def copy_insert(self, model, rows):
+        """대량 행을 PostgreSQL COPY FROM STDIN으로 적재 (커밋은 호출자가 수행)
+        
+        행별 INSERT 처리 없이 한 번의 구문 분석/권한 확인으로 적재하므로 대량 적재에 가장 빠르다.
+        """
+        if not rows:
+            return 0
+        
+        table = model.__table__
+        columns = list(rows[0].keys())
+        json_flags = [isinstance(table.c[name].type, JSON) for name in columns]
+        
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(
+                self._copy_value(row[name], is_json) for name, is_json in zip(columns, json_flags)
+            ))
+            buffer.write("\n")
+        buffer.seek(0)
+        
+        column_list = ", ".join(f'"{name}"' for name in columns)
+        with self.session.connection().connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.fullname} ({column_list}) FROM STDIN", buffer)
+        return len(rows)
+    
+    @staticmethod
+    def _document_row(doc_metadata):
+        """문서 메타데이터 dict를 document_metadata 행으로 변환"""
+        return {
+            "doc_id": doc_metadata["doc_id"],
+            "filename": doc_metadata["filename"],
+            "file_type": doc_metadata["file_type"],
+            "category": doc_metadata["category"],
+            "version": doc_metadata["version"],
+            "chunks": doc_metadata["chunks"],
+            "uploaded_by": doc_metadata["uploaded_by"],
+            "upload_time": doc_metadata["upload_time"],
+            "is_active": doc_metadata["is_active"],
+            "vector_store_path": doc_metadata["vector_store_path"],
+            "description": doc_metadata.get("description", ""),
+            "file_hash": doc_metadata.get("file_hash")
+        }
+    
     def add_document(self, doc_metadata):
         """문서 메타데이터 추가"""
-        doc = DocumentMetadata(
-            doc_id=doc_metadata["doc_id"],
-            filename=doc_metadata["filename"],
-            file_type=doc_metadata["file_type"],
-            category=doc_metadata["category"],
-            version=doc_metadata["version"],
-            chunks=doc_metadata["chunks"],
-            uploaded_by=doc_metadata["uploaded_by"],
-            upload_time=doc_metadata["upload_time"],
-            is_active=doc_metadata["is_active"],
-            vector_store_path=doc_metadata["vector_store_path"],
-            description=doc_metadata.get("description", "")
-        )
+        doc = DocumentMetadata(**self._document_row(doc_metadata))
         
         self.session.add(doc)
         self.session.commit()
         return doc
     
+    def add_documents(self, docs_metadata):
+        """문서 메타데이터 여러 개를 한 번의 INSERT/커밋으로 추가"""
+        try:
+            count = self.insert_many(DocumentMetadata, [self._document_row(doc) for doc in docs_metadata])
+            self.session.commit()
+            return count
+        except Exception:
+            self.session.rollback()
+            raise
+    
     def get_active_documents(self):
         """활성 상태인 모든 문서 조회"""
         return self.session.query(DocumentMetadata).filter(DocumentMetadata.is_active == True).all()
     
+    def get_active_categories(self):
+        """활성 문서의 카테고리 목록 조회 (DB에서 DISTINCT/정렬 처리, 카테고리 컬럼만 전송)"""
+        rows = self.session.query(DocumentMetadata.category).filter(
+            DocumentMetadata.is_active.is_(True)
+        ).distinct().order_by(DocumentMetadata.category).all()
+        return [category for (category,) in rows]
+    
+    def get_all_categories(self):
+        """비활성 문서를 포함한 모든 문서의 카테고리 목록 조회 (권한 관리용)"""
+        rows = self.session.query(DocumentMetadata.category).distinct().order_by(DocumentMetadata.category).all()
+        return [category for (category,) in rows]
+    
+    def get_user_permissions(self, username):
+        """사용자의 카테고리별 권한 (category, can_view, can_upload) 목록을 한 번에 조회"""
+        return self.session.query(
+            CategoryPermission.category,
+            CategoryPermission.can_view,
+            CategoryPermission.can_upload
+        ).filter(CategoryPermission.username == username).all()
+    
     def get_documents_by_category(self, category):
         """카테고리별 문서 조회"""
         return self.session.query(DocumentMetadata).filter(
@@ -309,6 +529,57 @@ class DBManager:
             DocumentMetadata.is_active == True
         ).all()
     
+    @staticmethod
+    def _category_filters(category, search_term=None):
+        """카테고리별 활성 문서 조건 (검색어가 있으면 파일명/설명 ILIKE 조건 추가)"""
+        filters = [
+            DocumentMetadata.category == category,
+            DocumentMetadata.is_active == True
+        ]
+        if search_term:
+            # 검색어의 LIKE 와일드카드는 문자 그대로 비교
+            escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = f"%{escaped}%"
+            filters.append(or_(
+                DocumentMetadata.filename.ilike(pattern, escape="\\"),
+                DocumentMetadata.description.ilike(pattern, escape="\\")
+            ))
+        return filters
+    
+    def get_documents_by_category_paged(self, category, offset, limit, search_term=None):
+        """카테고리별 문서 한 페이지 조회 (파일명/최신 버전 순으로 정렬해 같은 파일이 붙어 나오도록)"""
+        return self.session.query(DocumentMetadata).filter(
+            *self._category_filters(category, search_term)
+        ).order_by(
+            DocumentMetadata.filename,
+            DocumentMetadata.version.desc()
+        ).offset(offset).limit(limit).all()
+    
+    def count_documents_by_category(self, category, search_term=None):
+        """카테고리별 활성 문서 수 (행을 불러오지 않고 COUNT만 조회)"""
+        return self.session.query(func.count(DocumentMetadata.doc_id)).filter(
+            *self._category_filters(category, search_term)
+        ).scalar() or 0
+    
+    def get_latest_document_version(self, filename, category):
+        """파일명/카테고리가 같은 활성 문서 중 최신 버전의 (doc_id, version) 조회"""
+        return self.session.query(
+            DocumentMetadata.doc_id,
+            DocumentMetadata.version
+        ).filter(
+            DocumentMetadata.filename == filename,
+            DocumentMetadata.category == category,
+            DocumentMetadata.is_active == True
+        ).order_by(DocumentMetadata.version.desc()).first()
+    
+    def get_document_by_hash(self, file_hash, category):
+        """같은 카테고리에서 내용 해시가 같은 활성 문서 조회"""
+        return self.session.query(DocumentMetadata).filter(
+            DocumentMetadata.file_hash == file_hash,
+            DocumentMetadata.category == category,
+            DocumentMetadata.is_active == True
+        ).first()
+    
     def add_conversation(self, conversation_data):
         """새 대화 추가"""
         conv = UserConversation(
@@ -338,6 +609,20 @@ class DBManager:
         self.session.commit()
         return msg
     
+    def add_messages(self, messages_data):
+        """대화 메시지 여러 개를 한 번의 INSERT/커밋으로 추가"""
+        self.insert_many(ConversationMessage, [
+            {
+                "message_id": message_data["message_id"],
+                "conversation_id": message_data["conversation_id"],
+                "role": message_data["role"],
+                "content": message_data["content"],
+                "timestamp": message_data["timestamp"]
+            }
+            for message_data in messages_data
+        ])
+        self.session.commit()
+    
     def get_user_conversations(self, username):
         """사용자별 대화 목록 조회"""
         return self.session.query(UserConversation).filter(
@@ -353,29 +638,84 @@ class DBManager:
     
     def update_conversation_title(self, conversation_id, new_title):
         """대화 제목 업데이트"""
-        conv = self.session.query(UserConversation).filter(
-            UserConversation.conversation_id == conversation_id
+        # 조회 없이 UPDATE ... RETURNING 한 번으로 처리 (기본 키 인덱스 사용)
+        updated = self.session.execute(
+            update(UserConversation)
+            .where(UserConversation.conversation_id == conversation_id)
+            .values(title=new_title, updated_at=datetime.datetime.utcnow())
+            .returning(UserConversation.conversation_id)
+            .execution_options(synchronize_session=False)
         ).first()
+        self.session.commit()
+        return updated is not None
+    
+    def archive_conversations(self, conversation_ids):
+        """여러 대화를 UPDATE 한 번으로 보관 처리 - 보관된 대화 수 반환"""
+        if not conversation_ids:
+            return 0
         
-        if conv:
-            conv.title = new_title
-            conv.updated_at = datetime.datetime.utcnow()
-            self.session.commit()
-            return True
-        return False
+        archived = self.session.query(UserConversation).filter(
+            UserConversation.conversation_id.in_(conversation_ids)
+        ).update(
+            {"is_archived": True, "updated_at": datetime.datetime.now()},
+            synchronize_session=False
+        )
+        self.session.commit()
+        return archived
     
     def log_usage(self, username, action_type, resource_id=None, details=None):
-        """사용 통계 기록"""
-        log = UsageStat(
-            username=username,
-            action_type=action_type,
-            resource_id=resource_id,
-            details=details or {}
-        )
+        """사용 통계 기록 - 버퍼에 추가만 하고 즉시 반환 (DB 기록은 백그라운드에서 일괄 처리)
         
-        self.session.add(log)
-        self.session.commit()
-        return log
+        프로세스가 비정상 종료되면 마지막 몇 초의 통계는 유실될 수 있다.
+        """
+        self._usage_buffer.append({
+            "username": username,
+            "action_type": action_type,
+            "resource_id": resource_id,
+            "timestamp": datetime.datetime.utcnow(),
+            "details": details or {}
+        })
+        
+        if self._usage_flusher is None:
+            self._start_usage_flusher()
+        if len(self._usage_buffer) >= USAGE_FLUSH_BATCH_SIZE:
+            self._usage_flush_event.set()
+    
+    def _start_usage_flusher(self):
+        """사용 통계 기록 스레드 시작 (처음 기록될 때 한 번)"""
+        with self._usage_flush_lock:
+            if self._usage_flusher is not None:
+                return
+            self._usage_flusher = threading.Thread(target=self._usage_flush_loop, name="usage-flush", daemon=True)
+            self._usage_flusher.start()
+            atexit.register(self.flush_usage)
+    
+    def _usage_flush_loop(self):
+        """USAGE_FLUSH_INTERVAL마다 또는 버퍼가 가득 차면 기록"""
+        while True:
+            self._usage_flush_event.wait(USAGE_FLUSH_INTERVAL)
+            self._usage_flush_event.clear()
+            self.flush_usage()
+            # 이 스레드의 세션이 연결을 계속 붙잡고 있지 않도록 기록 후 반납
+            self.close_session()
+    
+    def flush_usage(self):
+        """버퍼의 사용 통계를 한 번의 INSERT(대량이면 COPY)/커밋으로 기록 - 기록한 건수 반환"""
+        with self._usage_flush_lock:
+            rows = []
+            while self._usage_buffer:
+                rows.append(self._usage_buffer.popleft())
+            if not rows:
+                return 0
+            
+            try:
+                self.insert_many(UsageStat, rows)
+                self.session.commit()
+                return len(rows)
+            except Exception as e:
+                logger.error("사용 통계 기록 중 오류: %s", e)
+                self.session.rollback()
+                return 0
     
     def execute_query(self, query, params=None, fetch=False):
         """SQL 쿼리 실행"""
@@ -392,7 +732,7 @@ class DBManager:
                 return result.rowcount
         except Exception as e:
             self.session.rollback()
-            print(f"쿼리 실행 중 오류: {str(e)}")
+            logger.error("쿼리 실행 중 오류: %s", e)
             raise e
     
     
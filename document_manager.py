@@ -1,13 +1,119 @@
 # document_manager.py
 import streamlit as st
-import pandas as pd
 import os
 import time
 import uuid
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from db_models import DocumentMetadata, CategoryPermission
+import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+from sqlalchemy import create_engine, func
+from db_models import Base, DocumentMetadata, CategoryPermission, DocumentVersionLog, create_missing_indexes
+
+# 문서 탐색 화면의 카테고리별 페이지 크기와 문서별 변경 기록 표시 개수
+DOCUMENTS_PER_PAGE = 30
+VERSION_HISTORY_LIMIT = 10
+
+# 삭제된 문서의 벡터 저장소 파일 정리용 스레드 풀 (UI 요청을 디스크 작업으로 막지 않도록)
+_cleanup_executor = ThreadPoolExecutor(max_workers=2)
+
+def _remove_vector_store(vector_store_path: str):
+    """벡터 저장소 디렉토리 삭제 (백그라운드 스레드에서 실행)"""
+    try:
+        shutil.rmtree(vector_store_path, ignore_errors=True)
+        print(f"벡터 저장소 삭제 완료: {vector_store_path}")
+    except Exception as e:
+        print(f"벡터 저장소 삭제 중 오류: {str(e)}")
+
+# 문서가 추가/변경/삭제될 때마다 증가하는 버전 번호 (조회 캐시 무효화용, 모든 세션 공유)
+_documents_version = 0
+
+def _bump_documents_version():
+    """문서 조회 캐시 무효화"""
+    global _documents_version
+    _documents_version += 1
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_active_documents(version: int, _db_manager) -> List[DocumentMetadata]:
+    """활성 문서 목록 캐싱 - rerun마다 DB를 조회하지 않도록 문서 버전별로 재사용"""
+    return _db_manager.get_active_documents()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_category_page(category: str, search_term: str, offset: int, limit: int, version: int,
+                          _db_manager) -> List[DocumentMetadata]:
+    """카테고리별 문서 한 페이지 캐싱 (검색어가 있으면 DB에서 필터링)"""
+    return _db_manager.get_documents_by_category_paged(category, offset, limit, search_term)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_category_count(category: str, search_term: str, version: int, _db_manager) -> int:
+    """카테고리별 문서 수 캐싱 (검색어가 있으면 일치하는 문서 수)"""
+    return _db_manager.count_documents_by_category(category, search_term)
+
+@st.cache_data(ttl=60, max_entries=256, show_spinner=False)
+def _cached_document_by_id(doc_id: str, version: int, _db_manager) -> Optional[Dict[str, Any]]:
+    """문서 ID별 문서 정보 캐싱 - 같은 rerun/세션에서 반복 조회해도 DB는 문서 버전당 한 번만 조회"""
+    # 필요한 컬럼만 조회 (ORM 객체 생성 없이 튜플로 받음)
+    row = _db_manager.session.query(
+        DocumentMetadata.doc_id,
+        DocumentMetadata.filename,
+        DocumentMetadata.file_type,
+        DocumentMetadata.category,
+        DocumentMetadata.version,
+        DocumentMetadata.chunks,
+        DocumentMetadata.uploaded_by,
+        DocumentMetadata.upload_time,
+        DocumentMetadata.is_active,
+        DocumentMetadata.vector_store_path,
+        DocumentMetadata.description
+    ).filter(
+        DocumentMetadata.doc_id == doc_id
+    ).first()
+    
+    if not row:
+        return None
+    
+    doc = row._asdict()
+    doc["upload_time"] = str(doc["upload_time"])
+    return doc
+
+# 카테고리는 문서 업로드/삭제 시에만 바뀌고 그때 버전이 올라가므로 더 오래 유지
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_categories(version: int, _db_manager) -> List[str]:
+    """활성 문서의 카테고리 목록 캐싱 (문서 전체를 불러오지 않고 DISTINCT 조회)"""
+    return _db_manager.get_active_categories()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_all_categories(version: int, _db_manager) -> List[str]:
+    """비활성 문서를 포함한 전체 카테고리 목록 캐싱 (권한 관리 화면용)"""
+    return _db_manager.get_all_categories()
+
+# 카테고리 권한이 변경될 때마다 증가하는 버전 번호 (권한 조회 캐시 무효화용)
+_permissions_version = 0
+
+def _bump_permissions_version():
+    """권한 조회 캐시 무효화"""
+    global _permissions_version
+    _permissions_version += 1
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_user_permissions(username: str, version: int, _db_manager) -> Dict[str, Dict[str, bool]]:
+    """사용자의 카테고리별 권한을 한 번의 조회로 불러와 캐싱"""
+    return {
+        category: {"view": bool(can_view), "upload": bool(can_upload)}
+        for category, can_view, can_upload in _db_manager.get_user_permissions(username)
+    }
+
+# 변경 기록 화면에 표시하는 컬럼 (로그 전체 엔티티 대신 이 컬럼만 조회)
+_VERSION_LOG_COLUMNS = (
+    DocumentVersionLog.previous_version,
+    DocumentVersionLog.new_version,
+    DocumentVersionLog.change_description,
+    DocumentVersionLog.changed_by,
+    DocumentVersionLog.changed_at
+)
 
 class DocumentManager:
     """문서 관리 클래스: 문서 업로드, 검색, 권한 관리 등 기능 제공"""
@@ -23,22 +129,44 @@ class DocumentManager:
             return None
             
         try:
-            return self.db_manager.add_document(doc_metadata)
+            document = self.db_manager.add_document(doc_metadata)
+            _bump_documents_version()
+            return document
         except Exception as e:
             print(f"문서 추가 중 오류 발생: {str(e)}")
             return None
     
+    def add_documents(self, docs_metadata: List[Dict[str, Any]]) -> int:
+        """여러 문서 메타데이터를 한 번에 추가 (DB 왕복/커밋 1회) - 추가된 문서 수 반환"""
+        if not self.db_manager or not docs_metadata:
+            return 0
+            
+        try:
+            count = self.db_manager.add_documents(docs_metadata)
+            _bump_documents_version()
+            return count
+        except Exception as e:
+            print(f"문서 일괄 추가 중 오류 발생: {str(e)}")
+            return 0
+    
     def get_all_active_documents(self) -> List[DocumentMetadata]:
         """활성 상태인 모든 문서 조회"""
         if not self.db_manager:
             return []
             
         try:
-            return self.db_manager.get_active_documents()
+            return _cached_active_documents(_documents_version, self.db_manager)
         except Exception as e:
             print(f"문서 조회 중 오류 발생: {str(e)}")
             return []
     
+    def get_all_active_documents_grouped(self) -> Dict[str, List[DocumentMetadata]]:
+        """활성 문서를 카테고리별로 묶어 반환 (캐시된 전체 목록 1회 조회 후 메모리에서 그룹화)"""
+        grouped: Dict[str, List[DocumentMetadata]] = {}
+        for doc in self.get_all_active_documents():
+            grouped.setdefault(doc.category, []).append(doc)
+        return grouped
+    
     def get_documents_by_category(self, category: str) -> List[DocumentMetadata]:
         """카테고리별 문서 조회"""
         if not self.db_manager:
@@ -50,6 +178,64 @@ class DocumentManager:
             print(f"카테고리별 문서 조회 중 오류 발생: {str(e)}")
             return []
         
+    def get_documents_by_category_paged(self, category: str, offset: int, limit: int) -> List[DocumentMetadata]:
+        """카테고리별 문서를 offset/limit 범위만 조회"""
+        if not self.db_manager:
+            return []
+            
+        try:
+            return _cached_category_page(category, "", offset, limit, _documents_version, self.db_manager)
+        except Exception as e:
+            print(f"카테고리별 문서 페이지 조회 중 오류 발생: {str(e)}")
+            return []
+    
+    def search_documents(self, category: str, term: str, limit: int, offset: int = 0) -> List[DocumentMetadata]:
+        """카테고리 안에서 파일명/설명에 검색어가 포함된 문서를 DB에서 조회 (ILIKE)"""
+        if not self.db_manager:
+            return []
+            
+        try:
+            return _cached_category_page(category, term or "", offset, limit, _documents_version, self.db_manager)
+        except Exception as e:
+            print(f"문서 검색 중 오류 발생: {str(e)}")
+            return []
+    
+    def count_documents_by_category(self, category: str, term: str = "") -> int:
+        """카테고리별 활성 문서 수 조회 (term 지정 시 검색어와 일치하는 문서 수)"""
+        if not self.db_manager:
+            return 0
+            
+        try:
+            return _cached_category_count(category, term or "", _documents_version, self.db_manager)
+        except Exception as e:
+            print(f"카테고리별 문서 수 조회 중 오류 발생: {str(e)}")
+            return 0
+        
+    def get_latest_version(self, filename: str, category: str):
+        """동일 파일명 문서의 최신 버전 조회 - (doc_id, version), 없으면 (None, 0)"""
+        if not self.db_manager:
+            return None, 0
+            
+        try:
+            latest = self.db_manager.get_latest_document_version(filename, category)
+            if not latest:
+                return None, 0
+            return latest.doc_id, latest.version
+        except Exception as e:
+            print(f"최신 버전 조회 중 오류 발생: {str(e)}")
+            return None, 0
+        
+    def get_document_by_hash(self, file_hash: str, category: str) -> Optional[DocumentMetadata]:
+        """내용 해시가 같은 활성 문서 조회 (중복 업로드 확인용)"""
+        if not self.db_manager:
+            return None
+            
+        try:
+            return self.db_manager.get_document_by_hash(file_hash, category)
+        except Exception as e:
+            print(f"문서 해시 조회 중 오류 발생: {str(e)}")
+            return None
+        
     # DocumentManager 클래스에 추가할 get_document_by_id 메소드 수정
     def get_document_by_id(self, doc_id: str):
         """문서 ID로 문서 정보 조회"""
@@ -57,29 +243,7 @@ class DocumentManager:
             return None
             
         try:
-            # 문서 조회
-            from db_models import DocumentMetadata
-            doc = self.db_manager.session.query(DocumentMetadata).filter(
-                DocumentMetadata.doc_id == doc_id
-            ).first()
-            
-            if not doc:
-                return None
-                
-            # SQLAlchemy 모델을 딕셔너리로 변환
-            return {
-                "doc_id": doc.doc_id,
-                "filename": doc.filename,
-                "file_type": doc.file_type,
-                "category": doc.category,
-                "version": doc.version,
-                "chunks": doc.chunks,
-                "uploaded_by": doc.uploaded_by,
-                "upload_time": str(doc.upload_time),
-                "is_active": doc.is_active,
-                "vector_store_path": doc.vector_store_path,
-                "description": doc.description
-            }
+            return _cached_document_by_id(doc_id, _documents_version, self.db_manager)
         except Exception as e:
             print(f"문서 조회 중 오류 발생: {str(e)}")
             return None
@@ -90,57 +254,80 @@ class DocumentManager:
             return []
             
         try:
-            documents = self.db_manager.get_active_documents()
-            categories = set(doc.category for doc in documents)
-            return sorted(list(categories))
+            return _cached_categories(_documents_version, self.db_manager)
         except Exception as e:
             print(f"카테고리 조회 중 오류 발생: {str(e)}")
             return []
     
-    def check_document_permission(self, username: str, category: str, permission_type: str = 'view') -> bool:
-        """문서 접근 권한 확인"""
+    def get_all_categories(self) -> List[str]:
+        """비활성 문서만 남은 카테고리까지 포함한 전체 카테고리 조회 (권한 관리용)"""
         if not self.db_manager:
-            return True  # DB가 없는 경우 기본적으로 모든 권한 허용
+            return []
             
         try:
-            permissions = self.db_manager.session.query(CategoryPermission).filter(
-                CategoryPermission.username == username,
-                CategoryPermission.category == category
-            ).first()
+            return _cached_all_categories(_documents_version, self.db_manager)
+        except Exception as e:
+            print(f"카테고리 조회 중 오류 발생: {str(e)}")
+            return []
+    
+    def check_document_permission(self, username: str, category: str, permission_type: str = 'view') -> bool:
+        """문서 접근 권한 확인 (사용자 권한 전체를 한 번 불러온 캐시에서 조회)"""
+        if not self.db_manager:
+            return True  # DB가 없는 경우 기본적으로 모든 권한 허용
             
-            if not permissions:
-                return False
-                
-            if permission_type == 'view':
-                return permissions.can_view
-            elif permission_type == 'upload':
-                return permissions.can_upload
+        permissions = self.load_user_permissions(username).get(category)
+        if not permissions:
             return False
+        return permissions.get(permission_type, False)
+    
+    def load_user_permissions(self, username: str) -> Dict[str, Dict[str, bool]]:
+        """사용자의 카테고리별 권한 {category: {"view": bool, "upload": bool}} 조회 (캐시 사용)"""
+        if not self.db_manager:
+            return {}
+            
+        try:
+            return _cached_user_permissions(username, _permissions_version, self.db_manager)
         except Exception as e:
             print(f"권한 확인 중 오류 발생: {str(e)}")
-            return False
+            return {}
     
     def add_category_permission(self, username: str, category: str, can_view: bool = True, can_upload: bool = False) -> bool:
         """카테고리 권한 추가"""
-        if not self.db_manager:
-            return False
+        return self.add_category_permissions_bulk([{
+            "username": username,
+            "category": category,
+            "can_view": can_view,
+            "can_upload": can_upload
+        }]) == 1
+    
+    def add_category_permissions_bulk(self, items: List[Dict[str, Any]]) -> int:
+        """여러 카테고리 권한을 한 번의 INSERT/커밋으로 추가 - 추가된 권한 수 반환
+        
+        items: {"username", "category", "can_view"(기본 True), "can_upload"(기본 False), "assigned_by"(기본 username)}
+        """
+        if not self.db_manager or not items:
+            return 0
             
         try:
-            permission = CategoryPermission(
-                username=username,
-                category=category,
-                can_view=can_view,
-                can_upload=can_upload,
-                assigned_by=username,  # 현재 사용자를 할당자로 설정
-                assigned_at=time.strftime("%Y-%m-%d %H:%M:%S")
-            )
-            
-            self.db_manager.session.add(permission)
+            # 대량 적재(COPY)는 컬럼 기본값을 채우지 않으므로 할당 시각을 직접 지정
+            assigned_at = datetime.utcnow()
+            rows = [{
+                "username": item["username"],
+                "category": item["category"],
+                "can_view": item.get("can_view", True),
+                "can_upload": item.get("can_upload", False),
+                "assigned_by": item.get("assigned_by", item["username"]),
+                "assigned_at": assigned_at
+            } for item in items]
+            
+            count = self.db_manager.insert_many(CategoryPermission, rows)
             self.db_manager.session.commit()
-            return True
+            _bump_permissions_version()
+            return count
         except Exception as e:
             print(f"권한 추가 중 오류 발생: {str(e)}")
-            return False
+            self.db_manager.session.rollback()
+            return 0
     
     def update_document_status(self, doc_id: str, is_active: bool) -> bool:
         """문서 상태 업데이트"""
@@ -148,17 +335,18 @@ class DocumentManager:
             return False
             
         try:
-            document = self.db_manager.session.query(DocumentMetadata).filter(
+            # 조회 없이 UPDATE 한 번으로 상태 변경
+            affected = self.db_manager.session.query(DocumentMetadata).filter(
                 DocumentMetadata.doc_id == doc_id
-            ).first()
+            ).update({DocumentMetadata.is_active: is_active}, synchronize_session=False)
+            self.db_manager.session.commit()
             
-            if document:
-                document.is_active = is_active
-                self.db_manager.session.commit()
-                return True
-            return False
+            if affected:
+                _bump_documents_version()
+            return affected > 0
         except Exception as e:
             print(f"문서 상태 업데이트 중 오류 발생: {str(e)}")
+            self.db_manager.session.rollback()
             return False
     
     def delete_document(self, doc_id: str, permanently: bool = False) -> bool:
@@ -166,9 +354,12 @@ class DocumentManager:
         if not self.db_manager:
             return False
             
+        if not permanently:
+            # 비활성화만 (is_active = False로 설정) - 조회 없이 UPDATE 한 번으로 처리
+            return self.update_document_status(doc_id, is_active=False)
+            
         try:
             # 문서 조회
-            from db_models import DocumentMetadata
             document = self.db_manager.session.query(DocumentMetadata).filter(
                 DocumentMetadata.doc_id == doc_id
             ).first()
@@ -176,26 +367,22 @@ class DocumentManager:
             if not document:
                 return False
                 
-            if permanently:
-                # 벡터 저장소 경로 저장
-                vector_store_path = document.vector_store_path
-                
-                # 완전 삭제 (DB에서 삭제)
-                self.db_manager.session.delete(document)
-                
-                # 벡터 저장소 파일 삭제 (있는 경우)
-                if vector_store_path and os.path.exists(vector_store_path):
-                    import shutil
-                    try:
-                        shutil.rmtree(vector_store_path, ignore_errors=True)
-                        print(f"벡터 저장소 삭제 완료: {vector_store_path}")
-                    except Exception as e:
-                        print(f"벡터 저장소 삭제 중 오류: {str(e)}")
-            else:
-                # 비활성화만 (is_active = False로 설정)
-                document.is_active = False
-                
+            # 벡터 저장소 경로 저장
+            vector_store_path = document.vector_store_path
+            
+            # 완전 삭제 (DB에서 삭제) - 파일 정리보다 먼저 커밋해 메타데이터가 남지 않도록
+            self.db_manager.session.delete(document)
             self.db_manager.session.commit()
+            _bump_documents_version()
+            
+            # 이전 방식의 문서별 벡터 저장소 파일 삭제 (있는 경우, 백그라운드에서 처리)
+            # 전역 인덱스의 벡터는 다음 벡터 저장소 로드 시 정리됨
+            from vectorstore_utils import get_global_index_path
+            global_path = get_global_index_path(self.data_dir)
+            if (vector_store_path and os.path.exists(vector_store_path)
+                    and os.path.abspath(vector_store_path) != os.path.abspath(global_path)):
+                _cleanup_executor.submit(_remove_vector_store, vector_store_path)
+            
             return True
         except Exception as e:
             print(f"문서 삭제 중 오류 발생: {str(e)}")
@@ -206,44 +393,56 @@ class DocumentManager:
                                   new_version: int, change_description: str,
                                   changed_by: str) -> bool:
         """문서 버전 변경 로그 생성"""
-        if not self.db_manager:
-            return False
+        return self.create_document_version_logs_bulk([{
+            "doc_id": doc_id,
+            "previous_version": previous_version,
+            "new_version": new_version,
+            "change_description": change_description,
+            "changed_by": changed_by
+        }]) == 1
+    
+    def create_document_version_logs_bulk(self, logs: List[Dict[str, Any]]) -> int:
+        """여러 버전 변경 로그를 한 번의 INSERT/커밋으로 생성 - 생성된 로그 수 반환
+        
+        logs: {"doc_id", "previous_version", "new_version", "change_description", "changed_by"}
+        """
+        if not self.db_manager or not logs:
+            return 0
             
         try:
-            from db_models import DocumentVersionLog
-            
-            # 로그 생성
-            log = DocumentVersionLog(
-                doc_id=doc_id,
-                previous_version=previous_version,
-                new_version=new_version,
-                change_description=change_description,
-                changed_by=changed_by,
-                changed_at=datetime.utcnow()
-            )
-            
-            self.db_manager.session.add(log)
+            changed_at = datetime.utcnow()
+            rows = [{
+                "doc_id": log["doc_id"],
+                "previous_version": log["previous_version"],
+                "new_version": log["new_version"],
+                "change_description": log["change_description"],
+                "changed_by": log["changed_by"],
+                "changed_at": changed_at
+            } for log in logs]
+            
+            count = self.db_manager.insert_many(DocumentVersionLog, rows)
             self.db_manager.session.commit()
-            return True
+            return count
         except Exception as e:
             print(f"버전 로그 생성 중 오류 발생: {str(e)}")
             self.db_manager.session.rollback()
-            return False
+            return 0
     
-    def get_document_version_history(self, doc_id: str) -> list:
-        """문서의 버전 변경 기록 조회"""
+    def get_document_version_history(self, doc_id: str, limit: Optional[int] = None) -> list:
+        """문서의 버전 변경 기록 조회 (limit 지정 시 최근 기록만)"""
         if not self.db_manager:
             return []
             
         try:
-            from db_models import DocumentVersionLog
-            
             # 로그 조회
-            logs = self.db_manager.session.query(DocumentVersionLog).filter(
+            query = self.db_manager.session.query(*_VERSION_LOG_COLUMNS).filter(
                 DocumentVersionLog.doc_id == doc_id
-            ).order_by(DocumentVersionLog.changed_at.desc()).all()
+            ).order_by(DocumentVersionLog.changed_at.desc())
+            if limit:
+                query = query.limit(limit)
+            logs = query.all()
             
-            # SQLAlchemy 객체를 사전 형태로 변환
+            # 조회한 행을 사전 형태로 변환
             result = []
             for log in logs:
                 result.append({
@@ -259,6 +458,119 @@ class DocumentManager:
             print(f"버전 기록 조회 중 오류 발생: {str(e)}")
             return []
 
+    def get_version_histories_bulk(self, doc_ids: List[str], limit: Optional[int] = None) -> Dict[str, list]:
+        """여러 문서의 버전 변경 기록을 한 번의 IN 조회로 가져와 doc_id별로 묶어 반환 (limit: 문서별 최근 기록 수)"""
+        if not self.db_manager or not doc_ids:
+            return {}
+            
+        try:
+            session = self.db_manager.session
+            doc_filter = DocumentVersionLog.doc_id.in_(list(doc_ids))
+            
+            if limit:
+                # 문서별 최근 limit개만 DB에서 잘라서 전송 (row_number() OVER (PARTITION BY doc_id ...))
+                ranked = session.query(
+                    DocumentVersionLog.doc_id,
+                    *_VERSION_LOG_COLUMNS,
+                    func.row_number().over(
+                        partition_by=DocumentVersionLog.doc_id,
+                        order_by=DocumentVersionLog.changed_at.desc()
+                    ).label("row_number")
+                ).filter(doc_filter).subquery()
+                logs = session.query(ranked).filter(
+                    ranked.c.row_number <= limit
+                ).order_by(ranked.c.changed_at.desc()).all()
+            else:
+                logs = session.query(DocumentVersionLog.doc_id, *_VERSION_LOG_COLUMNS).filter(
+                    doc_filter
+                ).order_by(DocumentVersionLog.changed_at.desc()).all()
+            
+            histories: Dict[str, list] = {}
+            for log in logs:
+                histories.setdefault(log.doc_id, []).append({
+                    "previous_version": log.previous_version,
+                    "new_version": log.new_version,
+                    "change_description": log.change_description,
+                    "changed_by": log.changed_by,
+                    "changed_at": str(log.changed_at)
+                })
+            
+            return histories
+        except Exception as e:
+            print(f"버전 기록 일괄 조회 중 오류 발생: {str(e)}")
+            return {}
+
+def _render_document_detail(doc_manager, doc, version_logs):
+    """문서 목록에서 선택한 문서의 상세 패널 (보기/삭제 버튼과 변경 기록)"""
+    doc_id = doc.doc_id
+    
+    col1, col2, col3 = st.columns([2.5, 1, 0.5])
+    
+    with col1:
+        st.markdown(f"### 📄 {doc.filename} (v{doc.version})")
+        
+        # 설명 표시 (있는 경우)
+        if doc.description:
+            st.markdown(f"*{doc.description}*")
+    
+    with col2:
+        if st.button("문서 내용 보기", key=f"view_{doc_id}"):
+            st.session_state.selected_doc_id = doc_id
+    
+    with col3:
+        # 관리자인 경우에만 삭제 버튼 표시
+        if st.session_state.get("user_role") == "admin":
+            if st.button("🗑️", key=f"del_{doc_id}"):
+                st.session_state.delete_doc_confirm = doc_id
+    
+    # 삭제 확인 표시
+    if st.session_state.delete_doc_confirm == doc_id:
+        confirm_col1, confirm_col2, confirm_col3 = st.columns([2, 1, 1])
+        with confirm_col1:
+            st.warning(f"'{doc.filename}' 문서를 정말 삭제하시겠습니까?")
+        with confirm_col2:
+            if st.button("삭제 확인", key=f"confirm_del_{doc_id}"):
+                # 문서 삭제 처리 - 완전 삭제(permanently=True)
+                success = doc_manager.delete_document(doc_id, permanently=True)
+                
+                if success:
+                    st.success("문서가 성공적으로 삭제되었습니다.")
+                    # 벡터 저장소 갱신
+                    if "document_manager" in st.session_state and st.session_state.document_manager:
+                        # 임베딩 모델 설정
+                        embedding_model = st.session_state.get("EMBEDDING_MODEL", "text-embedding-3-small")
+                        api_key = os.environ.get("OPENAI_API_KEY")
+                        
+                        # 벡터 저장소 다시 로드
+                        from vectorstore_utils import load_vectorstores, set_session_vectorstore
+                        set_session_vectorstore(load_vectorstores(
+                            st.session_state.document_manager,
+                            embedding_model,
+                            api_key
+                        ))
+                        
+                    # 상태 초기화
+                    st.session_state.delete_doc_confirm = None
+                    st.session_state.selected_doc_id = None
+                    time.sleep(1)  # UI 업데이트를 위한 지연
+                    st.rerun()  # 페이지 새로고침
+                else:
+                    st.error("문서 삭제 중 오류가 발생했습니다.")
+        
+        with confirm_col3:
+            if st.button("취소", key=f"cancel_del_{doc_id}"):
+                st.session_state.delete_doc_confirm = None
+                st.rerun()
+    
+    # 버전 기록 표시
+    if version_logs:
+        with st.expander(f"변경 기록 ({len(version_logs)}개)"):
+            for log in version_logs:
+                st.write(f"v{log['previous_version']} → v{log['new_version']} ({log['changed_at']})")
+                st.write(f"변경 내용: {log['change_description']}")
+                st.write(f"변경자: {log['changed_by']}")
+                st.divider()
+
 # 문서 탐색 및 관리 컴포넌트 업데이트
 def document_explorer(doc_manager):
     """개선된 문서 탐색 컴포넌트 - 탭 전환 시 상태 초기화 기능 추가"""
@@ -300,6 +612,32 @@ def document_explorer(doc_manager):
     if "selected_doc_id" not in st.session_state:
         st.session_state.selected_doc_id = None
     
+    # pandas는 문서 목록 표를 그릴 때만 필요하므로 지연 임포트
+    import pandas as pd
+    
+    # 카테고리별 현재 페이지 문서를 탭 루프 전에 조회 (검색어 필터링과 페이지 분할은 DB에서 처리)
+    pages = {}
+    for category in categories:
+        page_key = f"page_{category}"
+        total = doc_manager.count_documents_by_category(category, search_term)
+        
+        # 검색어 변경 등으로 범위를 벗어난 페이지 번호 보정
+        page = min(st.session_state.get(page_key, 0), max(total - 1, 0) // DOCUMENTS_PER_PAGE)
+        st.session_state[page_key] = page
+        offset = page * DOCUMENTS_PER_PAGE
+        
+        if search_term:
+            page_docs = doc_manager.search_documents(category, search_term, DOCUMENTS_PER_PAGE, offset)
+        else:
+            page_docs = doc_manager.get_documents_by_category_paged(category, offset, DOCUMENTS_PER_PAGE)
+        pages[category] = (page_docs, total, page)
+    
+    # 표시되는 문서의 버전 기록을 한 번의 조회로 가져오기 (문서별 개별 조회 방지)
+    histories = doc_manager.get_version_histories_bulk(
+        [doc.doc_id for page_docs, _, _ in pages.values() for doc in page_docs],
+        limit=VERSION_HISTORY_LIMIT
+    )
+    
     # 카테고리별 탭 생성
     if len(categories) > 0:
         tabs = st.tabs(categories)
@@ -309,139 +647,51 @@ def document_explorer(doc_manager):
                 # 현재 카테고리 업데이트
                 st.session_state.current_doc_category = category
                 
-                # 해당 카테고리의 문서 목록 가져오기
-                documents = doc_manager.get_documents_by_category(category)
-                
-                # 검색어로 필터링
-                if search_term:
-                    filtered_docs = []
-                    for doc in documents:
-                        filename = doc.filename if hasattr(doc, 'filename') else ""
-                        description = doc.description if hasattr(doc, 'description') else ""
-                        if (search_term.lower() in filename.lower() or 
-                            search_term.lower() in description.lower()):
-                            filtered_docs.append(doc)
-                else:
-                    filtered_docs = documents
+                # 해당 카테고리의 현재 페이지 문서 (검색어 필터링 적용됨)
+                filtered_docs, total_docs, page = pages[category]
                 
                 if not filtered_docs:
                     st.info(f"'{category}' 카테고리에 {search_term}와(과) 일치하는 문서가 없습니다.")
                     continue
                 
-                # 문서를 파일명으로 그룹화하여 버전별로 표시
-                grouped_docs = {}
-                for doc in filtered_docs:
-                    filename = doc.filename if hasattr(doc, 'filename') else "Unknown"
-                    if filename not in grouped_docs:
-                        grouped_docs[filename] = []
-                    grouped_docs[filename].append(doc)
+                # 현재 페이지 문서를 하나의 표로 표시 (행마다 버튼/컬럼 위젯을 만들지 않고,
+                # 선택한 행에 대해서만 상세 패널 위젯을 구성)
+                table = pd.DataFrame([{
+                    "파일명": doc.filename,
+                    "버전": doc.version,
+                    "업로드 시간": str(doc.upload_time),
+                    "설명": doc.description or ""
+                } for doc in filtered_docs])
+                event = st.dataframe(
+                    table,
+                    hide_index=True,
+                    use_container_width=True,
+                    on_select="rerun",
+                    selection_mode="single-row",
+                    key=f"doc_table_{category}_{page}_{search_term}"
+                )
                 
-                # 각 문서 그룹 표시
-                for filename, docs in grouped_docs.items():
-                    # 버전별 정렬 (SQLAlchemy 객체에 직접 접근)
-                    docs.sort(key=lambda x: x.version if hasattr(x, 'version') else 0, reverse=True)
-                    
-                    # 파일명과 최신 버전 표시
-                    col1, col2, col3 = st.columns([2.5, 1, 0.5])
-                    
-                    with col1:
-                        doc_version = docs[0].version if hasattr(docs[0], 'version') else "?"
-                        st.markdown(f"### 📄 {filename} (v{doc_version})")
-                        
-                        # 설명 표시 (있는 경우)
-                        doc_description = docs[0].description if hasattr(docs[0], 'description') else ""
-                        if doc_description:
-                            st.markdown(f"*{doc_description}*")
-                    
-                    with col2:
-                        # 최신 버전 문서 선택 버튼
-                        doc_id = docs[0].doc_id if hasattr(docs[0], 'doc_id') else ""
-                        if st.button(f"문서 내용 보기", key=f"view_{doc_id}"):
-                            st.session_state.selected_doc_id = doc_id
-                    
-                    with col3:
-                        # 관리자인 경우에만 삭제 버튼 표시
-                        is_admin = st.session_state.get("user_role") == "admin"
-                        if is_admin:
-                            if st.button("🗑️", key=f"del_{doc_id}"):
-                                st.session_state.delete_doc_confirm = doc_id
-                    
-                    # 삭제 확인 표시
-                    if st.session_state.delete_doc_confirm == doc_id:
-                        confirm_col1, confirm_col2, confirm_col3 = st.columns([2, 1, 1])
-                        with confirm_col1:
-                            st.warning(f"'{filename}' 문서를 정말 삭제하시겠습니까?")
-                        with confirm_col2:
-                            if st.button("삭제 확인", key=f"confirm_del_{doc_id}"):
-                                # 문서 삭제 처리 - 완전 삭제(permanently=True)로 변경
-                                success = doc_manager.delete_document(doc_id, permanently=True)
-                                
-                                if success:
-                                    st.success("문서가 성공적으로 삭제되었습니다.")
-                                    # 벡터 저장소 갱신
-                                    if "document_manager" in st.session_state and st.session_state.document_manager:
-                                        # 임베딩 모델 설정
-                                        embedding_model = st.session_state.get("EMBEDDING_MODEL", "text-embedding-3-small")
-                                        api_key = os.environ.get("OPENAI_API_KEY")
-                                        
-                                        # 벡터 저장소 다시 로드
-                                        from vectorstore_utils import load_vectorstores
-                                        st.session_state.vectorstore = load_vectorstores(
-                                            st.session_state.document_manager,
-                                            embedding_model,
-                                            api_key
-                                        )
-                                        
-                                        # RAG 워크플로우 재생성
-                                        from rag_utils import create_rag_workflow
-                                        st.session_state.rag_workflow = create_rag_workflow()
-                                        
-                                    # 상태 초기화
-                                    st.session_state.delete_doc_confirm = None
-                                    st.session_state.selected_doc_id = None
-                                    time.sleep(1)  # UI 업데이트를 위한 지연
-                                    st.rerun()  # 페이지 새로고침
-                                else:
-                                    st.error("문서 삭제 중 오류가 발생했습니다.")
-                        
-                        with confirm_col3:
-                            if st.button("취소", key=f"cancel_del_{doc_id}"):
-                                st.session_state.delete_doc_confirm = None
-                                st.rerun()
-                    
-                    # 이전 버전 확장 섹션
-                    if len(docs) > 1:
-                        with st.expander(f"이전 버전 ({len(docs)-1}개)"):
-                            for idx, doc in enumerate(docs[1:]):
-                                col1, col2, col3 = st.columns([2.5, 1, 0.5])
-                                with col1:
-                                    doc_version = doc.version if hasattr(doc, 'version') else "?"
-                                    doc_upload_time = doc.upload_time if hasattr(doc, 'upload_time') else ""
-                                    st.write(f"v{doc_version} - {doc_upload_time}")
-                                with col2:
-                                    doc_id = doc.doc_id if hasattr(doc, 'doc_id') else ""
-                                    if st.button("보기", key=f"view_old_{doc_id}_{idx}"):
-                                        st.session_state.selected_doc_id = doc_id
-                                with col3:
-                                    # 관리자인 경우에만 삭제 버튼 표시 (이전 버전)
-                                    is_admin = st.session_state.get("user_role") == "admin"
-                                    if is_admin:
-                                        if st.button("🗑️", key=f"del_old_{doc_id}_{idx}"):
-                                            st.session_state.delete_doc_confirm = doc_id
-                    
-                    # 버전 기록 표시
-                    latest_doc_id = docs[0].doc_id if hasattr(docs[0], 'doc_id') else ""
-                    if latest_doc_id:
-                        version_logs = doc_manager.get_document_version_history(latest_doc_id)
-                        if version_logs:
-                            with st.expander(f"변경 기록 ({len(version_logs)}개)"):
-                                for log in version_logs:
-                                    st.write(f"v{log['previous_version']} → v{log['new_version']} ({log['changed_at']})")
-                                    st.write(f"변경 내용: {log['change_description']}")
-                                    st.write(f"변경자: {log['changed_by']}")
-                                    st.divider()
-                    
-                    st.divider()
+                selected_rows = [row for row in event.selection.rows if row < len(filtered_docs)]
+                if selected_rows:
+                    doc = filtered_docs[selected_rows[0]]
+                    _render_document_detail(doc_manager, doc, histories.get(doc.doc_id, []))
+                else:
+                    st.caption("행을 선택하면 문서 보기/삭제 및 변경 기록을 확인할 수 있습니다.")
+                
+                # 페이지 이동
+                total_pages = (total_docs + DOCUMENTS_PER_PAGE - 1) // DOCUMENTS_PER_PAGE
+                if total_pages > 1:
+                    prev_col, info_col, next_col = st.columns([1, 2, 1])
+                    with prev_col:
+                        if st.button("◀ 이전", key=f"prev_page_{category}", disabled=page == 0):
+                            st.session_state[f"page_{category}"] = page - 1
+                            st.rerun()
+                    with info_col:
+                        st.caption(f"{page + 1} / {total_pages} 페이지 (전체 {total_docs}개)")
+                    with next_col:
+                        if st.button("다음 ▶", key=f"next_page_{category}", disabled=page >= total_pages - 1):
+                            st.session_state[f"page_{category}"] = page + 1
+                            st.rerun()
     
     # 선택된 문서 내용 표시
     if st.session_state.selected_doc_id:
@@ -458,95 +708,68 @@ def document_explorer(doc_manager):
             st.session_state.selected_doc_id = None
             st.rerun()
 
+# PostgreSQLConnector 테이블 생성 여부 (프로세스당 한 번만 실행)
+_connector_schema_initialized = False
+
 # PostgreSQL 연결자 클래스 (선택적 사용)
 class PostgreSQLConnector:
     """PostgreSQL 데이터베이스 연결 및 쿼리 실행 클래스"""
     
-    def __init__(self, connection_params):
+    def __init__(self, connection_params, min_connections=1, max_connections=20):
         self.connection_params = connection_params
+        # 쿼리마다 새로 접속(TCP/TLS/인증)하지 않도록 연결을 풀에서 재사용
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections, max_connections, **connection_params
+        )
         self.initialize_tables()
     
     def get_connection(self):
-        """데이터베이스 연결 객체 반환"""
-        import psycopg2
-        import psycopg2.extras
+        """풀에서 데이터베이스 연결 객체 반환 (사용 후 release_connection으로 반납)
         
-        conn = psycopg2.connect(**self.connection_params)
-        conn.autocommit = True
+        자동 커밋은 사용하지 않으므로 호출자가 논리 단위마다 한 번 커밋한다 (`with conn:`).
+        """
+        conn = self._pool.getconn()
+        conn.autocommit = False
         return conn
     
+    def release_connection(self, conn):
+        """연결을 풀에 반납 (진행 중인 트랜잭션은 풀이 롤백)"""
+        self._pool.putconn(conn)
+    
+    def close(self):
+        """풀의 모든 연결 종료"""
+        self._pool.closeall()
+    
     def initialize_tables(self):
-        """필요한 테이블 초기화"""
+        """필요한 테이블 초기화 - 스키마는 db_models의 모델 정의를 그대로 사용 (프로세스당 한 번)"""
+        global _connector_schema_initialized
+        if _connector_schema_initialized:
+            return
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # 문서 메타데이터 테이블
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS document_metadata (
-                doc_id VARCHAR(50) PRIMARY KEY,
-                filename VARCHAR(255) NOT NULL,
-                file_type VARCHAR(20) NOT NULL,
-                category VARCHAR(100) NOT NULL,
-                version INTEGER NOT NULL,
-                chunks INTEGER NOT NULL,
-                uploaded_by VARCHAR(100) NOT NULL,
-                upload_time TIMESTAMP NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                vector_store_path VARCHAR(255),
-                description TEXT
-            )
-            """)
-            
-            # 사용자 대화 테이블
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_conversations (
-                conversation_id VARCHAR(50) PRIMARY KEY,
-                username VARCHAR(100) NOT NULL,
-                title VARCHAR(255) NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                updated_at TIMESTAMP NOT NULL,
-                is_archived BOOLEAN DEFAULT FALSE
-            )
-            """)
-            
-            # 대화 메시지 테이블
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversation_messages (
-                message_id VARCHAR(50) PRIMARY KEY,
-                conversation_id VARCHAR(50) REFERENCES user_conversations(conversation_id),
-                role VARCHAR(20) NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL
-            )
-            """)
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
+            engine = create_engine("postgresql+psycopg2://", creator=lambda: psycopg2.connect(**self.connection_params))
+            try:
+                Base.metadata.create_all(engine)
+                create_missing_indexes(engine)
+            finally:
+                engine.dispose()
+            _connector_schema_initialized = True
         except Exception as e:
             st.error(f"테이블 초기화 중 오류: {str(e)}")
     
     def execute_query(self, query, params=None):
         """쿼리 실행 및 결과 반환"""
-        import psycopg2.extras
-        
+        conn = None
         try:
             conn = self.get_connection()
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+            # 쿼리 하나를 하나의 트랜잭션으로 실행 (성공 시 커밋, 예외 시 롤백)
+            # RealDictCursor는 각 행을 바로 딕셔너리로 반환 (행마다 변환 루프 불필요)
+            with conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
                 cursor.execute(query, params)
                 
                 # SELECT 쿼리인 경우 결과 반환
                 if cursor.description:
-                    columns = [desc[0] for desc in cursor.description]
-                    results = cursor.fetchall()
-                    
-                    # 결과를 딕셔너리 리스트로 변환
-                    dict_results = []
-                    for row in results:
-                        dict_results.append({columns[i]: row[i] for i in range(len(columns))})
-                    return dict_results
+                    return cursor.fetchall()
                 
                 # 영향받은 행 수 반환
                 return cursor.rowcount
@@ -555,4 +778,37 @@ class PostgreSQLConnector:
             raise e
         finally:
             if conn:
-                conn.close()
\ No newline at end of file
+                self.release_connection(conn)
+    
+    def execute_batch(self, query, params_list, page_size=500):
+        """같은 쓰기 쿼리를 여러 파라미터로 실행 - 전체를 한 트랜잭션/커밋 1회로 처리, 실행한 파라미터 수 반환"""
+        params_list = list(params_list)
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn, conn.cursor() as cursor:
+                psycopg2.extras.execute_batch(cursor, query, params_list, page_size=page_size)
+            return len(params_list)
+        except Exception as e:
+            st.error(f"일괄 쿼리 실행 중 오류: {query} - {str(e)}")
+            raise e
+        finally:
+            if conn:
+                self.release_connection(conn)
+    
+    def stream_query(self, query, params=None, itersize=2000):
+        """서버 측(named) 커서로 SELECT 결과를 itersize 행씩 나눠 받아 한 행(딕셔너리)씩 반환
+        
+        전체 결과를 클라이언트 메모리에 올리지 않으므로 대화/사용 통계 같은 대용량 조회에 사용한다.
+        """
+        # named 커서는 트랜잭션 안에서만 사용할 수 있음 (get_connection은 자동 커밋 해제 상태)
+        conn = self.get_connection()
+        try:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}",
+                             cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                yield from cursor
+            conn.rollback()
+        finally:
+            self.release_connection(conn)
@@ -1,43 +1,179 @@
 # rag_utils.py
 import os
-from typing import List, Dict, Any, Optional, TypedDict, Union
+import asyncio
+import threading
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Union
 import streamlit as st
+import tiktoken
+from pydantic import BaseModel, Field
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # LangChain 관련 라이브러리
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, trim_messages
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langgraph.graph import StateGraph, END
-
-# LangGraph 상태 정의
-class AgentState(TypedDict):
-    question: str
-    context: List[str] 
-    answer: str
-    conversation_history: List[Dict[str, str]]
-    sources: List[Dict[str, str]]
-    need_more_info: bool
-    username: str  # 사용자 식별을 위한 필드 추가
-
-def retrieve_documents(state: AgentState) -> AgentState:
-    """문서 저장소에서 관련 문서를 검색하는 함수"""
-    # 세션 상태에서 벡터 저장소 가져오기
-    vectorstore = st.session_state.get("vectorstore")
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+# 프롬프트 템플릿 (모듈 로드 시 한 번만 파싱)
+# 대화 기록은 문자열이 아닌 역할별 메시지로 전달 (MessagesPlaceholder)
+RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """당신은 기업 내부 문서에 대한 질문에 답변하는 AI 어시스턴트입니다.
+사용자의 질문에 대해 아래 문맥 정보를 참고하여 정확하게 답변하세요.
+문맥 정보에 답이 없는 경우, "제공된 문서에서 관련 정보를 찾을 수 없습니다"라고 답하고 
+need_more_info를 True로 설정하세요. 그렇지 않으면 False로 설정하세요.
+
+문맥 정보:
+{context}"""),
+    MessagesPlaceholder("history"),
+    ("human", "{question}")
+])
+
+GENERAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """당신은 기업 내부 AI 어시스턴트입니다. 
+사용자의 질문에 정확하게 답변하세요.
+
+현재 업로드된 문서가 없습니다. 일반적인 지식을 바탕으로 답변합니다.
+다만, 사용자에게 더 정확한 답변을 위해 관련 문서를 업로드하면 좋을 것이라고 알려주세요."""),
+    MessagesPlaceholder("history"),
+    ("human", "{question}")
+])
+
+# RAG 답변 출력 스키마
+class RAGAnswer(BaseModel):
+    """문서 기반 답변과 추가 정보 필요 여부"""
+    answer: str = Field(description="사용자 질문에 대한 답변")
+    need_more_info: bool = Field(description="문맥 정보에 답이 없어 추가 문서가 필요한 경우 True")
+
+# 스트리밍 시 부분 JSON으로 파싱되도록 JSON 스키마 형태로 LLM에 전달
+RAG_ANSWER_SCHEMA = RAGAnswer.model_json_schema()
+
+# LLM에 전달할 최대 이전 대화 메시지 수 및 토큰 수
+MAX_HISTORY_MESSAGES = 6
+MAX_HISTORY_TOKENS = 1500
+HISTORY_ENCODING_NAME = "cl100k_base"
+
+# 검색 설정 - 후보를 조금 더 가져온 뒤 유사도가 낮은 청크는 프롬프트에서 제외
+RETRIEVAL_CANDIDATES = 8
+MAX_CONTEXT_DOCS = 5
+MIN_RELEVANCE_SCORE = 0.25
+
+# 관련 문서가 없을 때의 답변 (LLM 호출 생략)
+NO_CONTEXT_ANSWER = "제공된 문서에서 관련 정보를 찾을 수 없습니다."
+
+# 응답 생성 실패 시 안내 문구 (응답 캐시에 저장하지 않음)
+RAG_ERROR_RESPONSE = "죄송합니다. 질문 처리 중 오류가 발생했습니다. 나중에 다시 시도해주세요."
+LLM_ERROR_RESPONSE = "죄송합니다. 응답 생성 중 오류가 발생했습니다. 나중에 다시 시도해주세요."
+ERROR_RESPONSES = (RAG_ERROR_RESPONSE, LLM_ERROR_RESPONSE)
+
+# 응답 스트림 마지막에 전달되는 추가 정보 필요 신호 (화면 출력/응답 저장 대상 아님)
+NEED_MORE_INFO = object()
+
+# (프롬프트, LLM) 조합별로 구성된 체인 캐시
+_chain_cache: Dict[tuple, Any] = {}
+
+def get_llm(llm_provider="openai", llm_model="gpt-4o-mini", api_key=None):
+    """API 키별로 캐시된 LLM 클라이언트 반환"""
+    from vectorstore_utils import hash_api_key
+    return _cached_llm(llm_provider, llm_model, hash_api_key(api_key), api_key)
+
+@st.cache_resource(show_spinner=False)
+def _cached_llm(llm_provider, llm_model, api_key_hash, _api_key):
+    """LLM 클라이언트 초기화 및 캐싱 (제공자/모델/API 키 요약값별)"""
+    if llm_provider == "anthropic":
+        # anthropic SDK는 실제로 사용할 때만 임포트
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(model=llm_model, api_key=_api_key)
+    return ChatOpenAI(model=llm_model, api_key=_api_key)
+
+def get_current_llm():
+    """세션 설정에 맞는 캐시된 LLM 반환"""
+    llm_model = st.session_state.get("LLM_MODEL", "gpt-4o-mini")
+    llm_provider = st.session_state.get("LLM_PROVIDER", "openai")
+    anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
     
+    if llm_provider == "anthropic" and anthropic_api_key:
+        return get_llm("anthropic", llm_model, anthropic_api_key)
+    return get_llm("openai", llm_model, os.environ.get("OPENAI_API_KEY"))
+
+def get_chain(prompt_template, llm, output_schema=None):
+    """프롬프트 | LLM 체인을 한 번만 구성하여 재사용 (output_schema가 있으면 구조화 출력)"""
+    key = (id(prompt_template), id(llm), id(output_schema))
+    chain = _chain_cache.get(key)
+    if chain is None:
+        model = llm.with_structured_output(output_schema) if output_schema else llm
+        chain = _chain_cache[key] = prompt_template | model
+    return chain
+
+@lru_cache(maxsize=1)
+def _get_history_encoding():
+    """대화 기록 토큰 수 계산용 tiktoken 인코딩"""
+    return tiktoken.get_encoding(HISTORY_ENCODING_NAME)
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    """메시지 목록의 본문 토큰 수 합계"""
+    encoding = _get_history_encoding()
+    return sum(len(encoding.encode(str(msg.content))) for msg in messages)
+
+def to_history_messages(conversation_history: List[Dict[str, str]], question: str) -> List[BaseMessage]:
+    """최근 대화 기록을 역할별 메시지로 변환 (이미 저장된 현재 질문은 제외)"""
+    if (conversation_history
+            and conversation_history[-1]["role"] == "user"
+            and conversation_history[-1]["content"] == question):
+        conversation_history = conversation_history[:-1]
+    
+    # 최근 메시지만 전달하여 대화가 길어져도 프롬프트 길이를 일정하게 유지
+    recent_history = conversation_history[-MAX_HISTORY_MESSAGES:]
+    
+    messages = [
+        HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"])
+        for msg in recent_history
+    ]
+    
+    # 긴 답변이 섞여 있어도 토큰 예산을 넘지 않도록 오래된 메시지부터 제외
+    return trim_messages(
+        messages,
+        max_tokens=MAX_HISTORY_TOKENS,
+        token_counter=count_message_tokens,
+        strategy="last",
+        start_on="human"
+    )
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def embed_question(question: str, embedding_model: str, _embeddings) -> List[float]:
+    """질문 임베딩 캐싱 - 같은 질문을 다시 검색할 때 임베딩 API 호출 생략"""
+    return _embeddings.embed_query(question)
+
+def get_question_embedding(question: str, embeddings) -> List[float]:
+    """임베딩 모델별로 캐시된 질문 임베딩 반환"""
+    return embed_question(question, getattr(embeddings, "model", ""), embeddings)
+
+def retrieve_documents(vectorstore, question: str, category: Optional[str] = None):
+    """문서 저장소에서 관련 문서를 검색하여 (컨텍스트, 출처) 반환 (category가 있으면 해당 카테고리만)"""
     if not vectorstore:
-        return {**state, "context": [], "sources": []}
+        return [], []
     
-    # 검색 수행
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-    docs = retriever.get_relevant_documents(state["question"])
+    # 질문 임베딩 (캐시 재사용)
+    query_vector = get_question_embedding(question, vectorstore.embeddings)
     
-    # 컨텍스트 구성
+    # 검색 수행 (HNSW 인덱스 직접 조회)
+    # 카테고리 필터는 검색 후 거르지 않고 해당 카테고리의 벡터만 검색 대상으로 지정
+    if category:
+        from vectorstore_utils import similarity_search_in_category
+        scored_docs = similarity_search_in_category(vectorstore, query_vector, category, RETRIEVAL_CANDIDATES)
+    else:
+        scored_docs = vectorstore.similarity_search_with_score_by_vector(query_vector, k=RETRIEVAL_CANDIDATES)
+    
+    # 내적 인덱스의 점수는 코사인 유사도이므로 기준 미만의 청크는 제외
+    if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        scored_docs = [(doc, score) for doc, score in scored_docs if score >= MIN_RELEVANCE_SCORE]
+    scored_docs = scored_docs[:MAX_CONTEXT_DOCS]
+    
+    # 컨텍스트와 출처를 한 번에 구성
     contexts = []
     sources = []
     
-    for doc in docs:
+    for doc, _score in scored_docs:
         contexts.append(doc.page_content)
         sources.append({
             "source": doc.metadata.get("source_file", "Unknown"),
@@ -45,195 +181,170 @@ def retrieve_documents(state: AgentState) -> AgentState:
             "category": doc.metadata.get("category", "기타")
         })
     
-    return {**state, "context": contexts, "sources": sources}
+    return contexts, sources
 
-def generate_answer(state: AgentState) -> AgentState:
-    """검색된 문서를 바탕으로 질문에 대한 답변을 생성하는 함수"""
-    # LLM 모델 설정
-    llm_model = st.session_state.get("LLM_MODEL", "gpt-4o-mini")
-    llm_provider = st.session_state.get("LLM_PROVIDER", "openai")
-    api_key = os.environ.get("OPENAI_API_KEY")
-    anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-    
-    # LLM 모델 초기화
-    if llm_provider == "anthropic" and anthropic_api_key:
-        llm = ChatAnthropic(model=llm_model, api_key=anthropic_api_key)
-    else:
-        llm = ChatOpenAI(model=llm_model, api_key=api_key)
-    
-    # 프롬프트 템플릿 정의
-    template = """
-    당신은 기업 내부 문서에 대한 질문에 답변하는 AI 어시스턴트입니다.
-    사용자의 질문에 대해 아래 문맥 정보를 참고하여 정확하게 답변하세요.
-    문맥 정보에 답이 없는 경우, "제공된 문서에서 관련 정보를 찾을 수 없습니다"라고 답하고 
-    need_more_info를 True로 설정하세요. 그렇지 않으면 False로 설정하세요.
-    
-    이전 대화 기록: {conversation_history}
-    
-    문맥 정보:
-    {context}
-    
-    질문: {question}
-    
-    답변:
-    """
-    
-    prompt = ChatPromptTemplate.from_template(template)
-    
+def build_rag_inputs(question: str, contexts: List[str], conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    """RAG 프롬프트 입력 구성"""
     # 컨텍스트 구성
-    context_text = "\n\n".join(state["context"]) if state["context"] else "관련 문서가 없습니다."
-    
-    # 이전 대화 기록
-    conversation_history = state.get("conversation_history", [])
+    context_text = "\n\n".join(contexts) if contexts else "관련 문서가 없습니다."
     
-    # 입력 구성
-    inputs = {
-        "question": state["question"],
+    return {
+        "question": question,
         "context": context_text,
-        "conversation_history": str(conversation_history)
+        "history": to_history_messages(conversation_history, question)
     }
+
+def stream_answer(question: str, contexts: List[str], conversation_history: List[Dict[str, str]]):
+    """검색된 문서를 바탕으로 답변을 생성하면서 새로 생성된 텍스트 조각을 순서대로 반환
     
-    # 답변 생성
-    chain = prompt | llm | StrOutputParser()
-    answer = chain.invoke(inputs)
+    스트리밍이 끝나면 구조화 출력의 need_more_info 값을 생성기 반환값으로 돌려준다.
+    """
+    # 관련 문서가 없으면 LLM을 호출하지 않음
+    if not contexts:
+        yield NO_CONTEXT_ANSWER
+        return True
     
-    # 추가 정보 필요 여부 판단
-    need_more_info = "제공된 문서에서 관련 정보를 찾을 수 없습니다" in answer
+    llm = get_current_llm()
+    chain = get_chain(RAG_PROMPT, llm, RAG_ANSWER_SCHEMA)
     
-    return {
-        **state, 
-        "answer": answer, 
-        "need_more_info": need_more_info
-    }
+    # 구조화 출력은 부분 JSON으로 스트리밍되므로 answer 필드의 늘어난 부분만 전달
+    streamed = ""
+    partial = None
+    for partial in chain.stream(build_rag_inputs(question, contexts, conversation_history)):
+        answer = (partial or {}).get("answer") or ""
+        if len(answer) > len(streamed):
+            yield answer[len(streamed):]
+            streamed = answer
+    
+    return bool((partial or {}).get("need_more_info"))
 
-def add_source_information(state: AgentState) -> AgentState:
+def add_source_information(answer: str, sources: List[Dict[str, str]]) -> str:
     """답변에 소스 정보를 추가하는 함수"""
-    if not state.get("sources") or len(state["sources"]) == 0:
+    if not sources:
         # 소스가 없는 경우 일반 정보 추가
-        enhanced_answer = state["answer"] + "\n\n*참고: 보다 구체적이고 정확한 답변을 위해서는 관련 문서가 필요합니다.*"
-        return {**state, "answer": enhanced_answer}
+        return answer + "\n\n*참고: 보다 구체적이고 정확한 답변을 위해서는 관련 문서가 필요합니다.*"
         
-    sources_info = "\n\n**참고 문서:**\n"
-    for src in state["sources"]:
+    # 같은 (파일, 페이지) 출처는 한 번만 표시 (순서 유지)
+    seen = set()
+    lines = []
+    for src in sources:
         # 딕셔너리 형태로 오는 경우
         if isinstance(src, dict):
             source = src.get('source', 'Unknown')
             page = src.get('page', 'N/A')
             category = src.get('category', '')
+            key = (source, page)
+            if key in seen:
+                continue
+            seen.add(key)
             
-            sources_info += f"- {source}"
+            line = f"- {source}"
             if page != "N/A":
-                sources_info += f" (페이지: {page})"
+                line += f" (페이지: {page})"
             if category:
-                sources_info += f" [카테고리: {category}]"
-            sources_info += "\n"
+                line += f" [카테고리: {category}]"
+            lines.append(line)
         # 문자열이나 다른 형태로 오는 경우
         else:
-            sources_info += f"- {str(src)}\n"
+            key = str(src)
+            if key in seen:
+                continue
+            seen.add(key)
+            lines.append(f"- {key}")
     
-    enhanced_answer = state["answer"] + sources_info
+    sources_info = "\n\n**참고 문서:**\n" + "\n".join(lines) + "\n"
     
-    return {**state, "answer": enhanced_answer}
+    return answer + sources_info
 
-def create_rag_workflow():
-    """RAG 워크플로우 생성"""
-    # 워크플로우 정의
-    workflow = StateGraph(AgentState)
-    
-    # 노드 추가
-    workflow.add_node("retrieve", retrieve_documents)
-    workflow.add_node("generate", generate_answer)
-    workflow.add_node("add_sources", add_source_information)
+def _with_script_run_ctx(func):
+    """작업자 스레드에서도 st.session_state에 접근할 수 있도록 현재 스크립트 컨텍스트 연결"""
+    ctx = get_script_run_ctx()
     
-    # 엣지 설정
-    workflow.add_edge("retrieve", "generate")
-    workflow.add_edge("generate", "add_sources")
-    workflow.add_edge("add_sources", END)
-    
-    # 시작 노드 설정
-    workflow.set_entry_point("retrieve")
+    def wrapper(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+    return wrapper
+
+def load_conversation_history(conv_manager, username, conversation_id) -> List[Dict[str, str]]:
+    """LLM에 전달할 대화 기록 조회"""
+    if not conv_manager:
+        return []
     
-    # 그래프 컴파일
-    return workflow.compile()
+    messages = conv_manager.get_conversation_messages(username, conversation_id)
+    return [
+        {"role": msg["role"], "content": msg["content"]} 
+        for msg in messages
+    ]
+
+def _load_history_in_worker(conv_manager, username, conversation_id) -> List[Dict[str, str]]:
+    """작업자 스레드에서 대화 기록 조회 - 이 스레드에서 생긴 DB 세션은 조회 후 바로 반납"""
+    try:
+        return load_conversation_history(conv_manager, username, conversation_id)
+    finally:
+        db_manager = getattr(conv_manager, "db_manager", None)
+        if db_manager is not None:
+            db_manager.close_session()
 
-@st.cache_data(ttl=600, show_spinner=False)
-def generate_response(prompt, username, conversation_id, _conv_manager=None):
-    """사용자 질문에 대한 응답 생성"""
-    # 대화 기록 가져오기
+async def _gather_history_and_documents(conv_manager, username, conversation_id, vectorstore, question, category=None):
+    """대화 기록 조회(DB)와 문서 검색(FAISS)을 동시에 실행"""
+    history_task = asyncio.to_thread(
+        _with_script_run_ctx(_load_history_in_worker), conv_manager, username, conversation_id
+    )
+    retrieve_task = asyncio.to_thread(
+        _with_script_run_ctx(retrieve_documents), vectorstore, question, category
+    )
+    return await asyncio.gather(history_task, retrieve_task)
+
+def generate_response_stream(prompt, username, conversation_id, _conv_manager=None, category=None):
+    """사용자 질문에 대한 응답을 토큰 단위로 생성 (st.write_stream에 전달)
+    
+    문서에서 답을 찾지 못하면 마지막 조각으로 NEED_MORE_INFO 신호를 전달한다.
+    """
     conv_manager = _conv_manager or st.session_state.get("conversation_manager")
-    if conv_manager:
-        messages = conv_manager.get_conversation_messages(username, conversation_id)
-        conversation_history = [
-            {"role": msg["role"], "content": msg["content"]} 
-            for msg in messages
-        ]
-    else:
-        conversation_history = []
     
     # 벡터 스토어 상태 확인
-    has_vectorstore = "vectorstore" in st.session_state and st.session_state.vectorstore is not None
+    vectorstore = st.session_state.get("vectorstore")
     
-    # LangGraph 워크플로우가 설정되어 있고 벡터 스토어가 있으면 RAG 사용
-    if has_vectorstore and 'rag_workflow' in st.session_state:
+    # 벡터 스토어가 있으면 RAG 사용
+    if vectorstore is not None:
         try:
-            # 초기 상태 설정
-            initial_state = {
-                "question": prompt,
-                "context": [],
-                "answer": "",
-                "conversation_history": conversation_history,
-                "sources": [],
-                "need_more_info": False,
-                "username": username
-            }
-            
-            # 워크플로우 실행
-            result = st.session_state.rag_workflow.invoke(initial_state)
+            # 대화 기록 조회와 문서 검색을 병렬로 실행한 뒤 답변 생성
+            conversation_history, (contexts, sources) = asyncio.run(
+                _gather_history_and_documents(conv_manager, username, conversation_id, vectorstore, prompt, category)
+            )
             
             # 디버그 로그
-            print(f"RAG 결과: {result.get('sources', [])} 소스 찾음")
+            print(f"RAG 결과: {sources} 소스 찾음")
+            
+            need_more_info = yield from stream_answer(prompt, contexts, conversation_history)
+            
+            # 답변 스트리밍이 끝난 뒤 출처 정보 추가
+            yield add_source_information("", sources)
             
-            # 답변 반환
-            return result["answer"]
+            # 문서에서 답을 찾지 못한 경우 호출 측에서 안내할 수 있도록 신호 전달
+            if need_more_info:
+                yield NEED_MORE_INFO
             
         except Exception as e:
             st.error(f"RAG 응답 생성 중 오류: {str(e)}")
             # 오류 발생 시 기본 응답으로 폴백
-            return f"죄송합니다. 질문 처리 중 오류가 발생했습니다. 나중에 다시 시도해주세요."
+            yield RAG_ERROR_RESPONSE
     else:
         # 기본 LLM 사용 (RAG가 없는 경우)
-        llm_model = st.session_state.get("LLM_MODEL", "gpt-4o-mini")
-        api_key = os.environ.get("OPENAI_API_KEY")
-        llm = ChatOpenAI(model=llm_model, api_key=api_key)
+        conversation_history = load_conversation_history(conv_manager, username, conversation_id)
+        llm = get_current_llm()
             
-        template = """
-        당신은 기업 내부 AI 어시스턴트입니다. 
-        사용자의 질문에 정확하게 답변하세요.
-        
-        현재 업로드된 문서가 없습니다. 일반적인 지식을 바탕으로 답변합니다.
-        다만, 사용자에게 더 정확한 답변을 위해 관련 문서를 업로드하면 좋을 것이라고 알려주세요.
-        
-        이전 대화 기록: {conversation_history}
-        
-        질문: {question}
-        
-        답변:
-        """
-        
-        prompt_template = ChatPromptTemplate.from_template(template)
-        chain = prompt_template | llm | StrOutputParser()
+        chain = get_chain(GENERAL_PROMPT, llm)
         
         try:
-            response = chain.invoke({
+            for chunk in chain.stream({
                 "question": prompt,
-                "conversation_history": str(conversation_history)
-            })
+                "history": to_history_messages(conversation_history, prompt)
+            }):
+                yield chunk.content
             
             # 문서가 없을 때 안내 메시지 추가
-            if not has_vectorstore:
-                response += "\n\n*참고: 보다 구체적이고 정확한 답변을 위해서는 관련 문서가 필요합니다.*"
-            
-            return response
+            yield "\n\n*참고: 보다 구체적이고 정확한 답변을 위해서는 관련 문서가 필요합니다.*"
         except Exception as e:
             st.error(f"LLM 응답 생성 중 오류: {str(e)}")
-            return "죄송합니다. 응답 생성 중 오류가 발생했습니다. 나중에 다시 시도해주세요."
\ No newline at end of file
+            yield LLM_ERROR_RESPONSE
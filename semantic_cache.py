@@ -0,0 +1,171 @@
+# semantic_cache.py
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import faiss
+import streamlit as st
+
+# 의미 캐시 기본 설정
+SEMANTIC_CACHE_THRESHOLD = 0.92   # 코사인 유사도 기준
+SEMANTIC_CACHE_TTL = 3600         # 초 단위 유효 시간
+SEMANTIC_CACHE_MAX_ENTRIES = 256  # 네임스페이스별 최대 항목 수
+
+# 완전 일치 캐시 기본 설정 (세션별)
+EXACT_CACHE_TTL = 3600
+EXACT_CACHE_MAX_ENTRIES = 512
+
+class SemanticCache:
+    """의미 기반 응답 캐시: 질문 임베딩의 코사인 유사도가 기준 이상이면 이전 응답 재사용
+
+    네임스페이스(사용자, 검색 범위 등)별로 정규화된 벡터를 FAISS 내적 인덱스에 저장한다.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: int = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._namespaces: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        """단위 길이로 정규화된 (1, d) float32 벡터 반환"""
+        vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, namespace: Hashable, vector) -> Optional[str]:
+        """가장 유사한 이전 질문의 응답 조회 - 기준 미달이거나 만료되었으면 None"""
+        query = self._normalize(vector)
+
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if not entry or entry["index"].ntotal == 0 or entry["index"].d != query.shape[1]:
+                return None
+
+            scores, ids = entry["index"].search(query, 1)
+            position = ids[0][0]
+            if position < 0 or scores[0][0] < self.threshold:
+                return None
+
+            timestamp, _prompt, response = entry["items"][position]
+            if time.time() - timestamp > self.ttl:
+                return None
+            return response
+
+    def add(self, namespace: Hashable, vector, prompt: str, response: str) -> None:
+        """질문 임베딩과 응답 저장 (만료/초과 항목은 이때 정리)"""
+        vector = self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            self._purge_expired_namespaces(now)
+
+            entry = self._namespaces.get(namespace)
+            if entry is None or entry["index"].d != vector.shape[1]:
+                entry = self._namespaces[namespace] = {
+                    "index": faiss.IndexFlatIP(vector.shape[1]),
+                    "vectors": [],
+                    "items": []
+                }
+
+            # 유효한 최근 항목만 남기고 인덱스 재구성
+            keep = [i for i, (timestamp, _, _) in enumerate(entry["items"]) if now - timestamp <= self.ttl]
+            keep = keep[-(self.max_entries - 1):] if self.max_entries > 1 else []
+            if len(keep) < len(entry["items"]):
+                entry["vectors"] = [entry["vectors"][i] for i in keep]
+                entry["items"] = [entry["items"][i] for i in keep]
+                entry["index"].reset()
+                if entry["vectors"]:
+                    entry["index"].add(np.vstack(entry["vectors"]))
+
+            entry["index"].add(vector)
+            entry["vectors"].append(vector)
+            entry["items"].append((now, prompt, response))
+
+    def _purge_expired_namespaces(self, now: float) -> None:
+        """모든 항목이 만료된 네임스페이스 제거 (잠금 보유 상태에서 호출)"""
+        expired = [
+            namespace for namespace, entry in self._namespaces.items()
+            if not entry["items"] or now - entry["items"][-1][0] > self.ttl
+        ]
+        for namespace in expired:
+            del self._namespaces[namespace]
+
+    def cache_stream(self, namespace: Hashable, vector, prompt: str, stream: Iterable[str],
+                     exclude: Iterable[str] = ()) -> Iterator[str]:
+        """응답 스트림을 그대로 전달하면서 끝까지 생성되면 전체 응답을 캐시에 저장"""
+        return _store_when_complete(
+            stream, lambda response: self.add(namespace, vector, prompt, response), exclude
+        )
+
+class ExactCache:
+    """완전히 같은 요청에 대한 LRU 응답 캐시 (임베딩 호출 없이 해시 키로 조회)"""
+
+    def __init__(self, ttl: int = EXACT_CACHE_TTL, max_entries: int = EXACT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """요청 구성 요소로 캐시 키 생성"""
+        return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+    def get(self, key: str) -> Optional[str]:
+        """캐시된 응답 조회 (조회된 항목은 최근 사용으로 이동)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        timestamp, response = entry
+        if time.time() - timestamp > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: str) -> None:
+        """응답 저장 (만료 항목 정리 후 용량 초과 시 가장 오래된 항목 제거)"""
+        now = time.time()
+        for expired_key in [k for k, (timestamp, _) in self._entries.items() if now - timestamp > self.ttl]:
+            del self._entries[expired_key]
+
+        self._entries[key] = (now, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def cache_stream(self, key: str, stream: Iterable[str], exclude: Iterable[str] = ()) -> Iterator[str]:
+        """응답 스트림을 그대로 전달하면서 끝까지 생성되면 전체 응답을 캐시에 저장"""
+        return _store_when_complete(stream, lambda response: self.put(key, response), exclude)
+
+def _store_when_complete(stream: Iterable[str], store: Callable[[str], None],
+                         exclude: Iterable[str] = ()) -> Iterator[str]:
+    """스트림 조각을 전달하고, 끝까지 생성된 전체 응답을 store로 저장
+
+    exclude에 포함된 문구로 끝나는 응답(오류 안내 등)과 문자열이 아닌 신호 조각
+    (추가 정보 필요 등)이 포함된 응답은 저장하지 않는다.
+    """
+    chunks: List[str] = []
+    has_signal = False
+    for chunk in stream:
+        if isinstance(chunk, str):
+            chunks.append(chunk)
+        else:
+            has_signal = True
+        yield chunk
+
+    response = "".join(chunks)
+    if response and not has_signal and not any(response.endswith(text) for text in exclude):
+        store(response)
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticCache:
+    """모든 세션이 공유하는 의미 캐시 (사용자별로 네임스페이스 분리)"""
+    return SemanticCache()
@@ -3,9 +3,8 @@ import streamlit as st
 import time
 from datetime import datetime
 
-def add_fixed_header_style():
-    """상단 고정 헤더를 위한 CSS 스타일 추가"""
-    st.markdown("""
+# 앱 전역 CSS (고정 헤더 + 고정 탭 스타일을 하나로 병합)
+APP_CSS = """
     <style>
         /* 상단 고정 헤더 스타일 */
         .fixed-header {
@@ -103,8 +102,28 @@ def add_fixed_header_style():
             margin: 5px 0;
             align-self: flex-start;
         }
+        
+        /* 탭 영역 상단 고정 */
+        [data-testid="stVerticalBlock"] div:has([data-testid="stTabs"]) {
+            position: sticky;
+            top: 0;
+            background-color: white;
+            z-index: 999;
+            padding: 3px 0px;
+            border-bottom: 1px solid #f0f2f6;
+        }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+@st.cache_resource(show_spinner=False)
+def _inject_css():
+    """CSS를 한 번만 생성하고 이후 rerun에서는 캐시된 요소를 재사용"""
+    st.markdown(APP_CSS, unsafe_allow_html=True)
+    return True
+
+def add_fixed_header_style():
+    """상단 고정 헤더 및 탭을 위한 CSS 스타일 추가"""
+    _inject_css()
 
 def render_header(username=None, user_role=None):
     """앱 헤더 렌더링"""
@@ -129,20 +148,7 @@ def render_fixed_tabs():
     fixed_header = st.container()
     
     with fixed_header:
-        # CSS로 고정 스타일 적용
-        st.markdown('''
-        <style>
-            [data-testid="stVerticalBlock"] div:has([data-testid="stTabs"]) {
-                position: sticky;
-                top: 0;
-                background-color: white;
-                z-index: 999;
-                padding: 3px 0px;
-                border-bottom: 1px solid #f0f2f6;
-            }
-        </style>
-        ''', unsafe_allow_html=True)
-        
+        # 고정 스타일은 add_fixed_header_style()의 전역 CSS에 포함됨
         # 탭 생성
         tabs = st.tabs(["대화하기", "문서 탐색", "설정"])
     
@@ -154,10 +160,11 @@ def render_document_stats(vectorstore=None):
     
     with col1:
         if vectorstore:
-            try:
-                doc_count = len(vectorstore.docstore._dict)
+            # 벡터 저장소 교체 시 갱신되는 청크 수 사용
+            doc_count = st.session_state.get("vectorstore_doc_count")
+            if doc_count is not None:
                 st.success(f"문서가 임베딩되었습니다. {doc_count}개의 문서 청크가 검색 가능합니다.")
-            except Exception as e:
+            else:
                 st.info("문서 정보를 불러오는 중 오류가 발생했습니다.")
         else:
             st.info("아직 업로드된 문서가 없습니다. 일반적인 지식을 기반으로 답변합니다.")
@@ -178,6 +185,19 @@ def render_document_list(document_manager):
             if len(available_docs) > 10:
                 st.write(f"...외 {len(available_docs)-10}개 더 있음")
 
+def render_category_filter(document_manager):
+    """대화 시 검색할 문서 카테고리 선택 - 전체 선택 시 None 반환"""
+    categories = document_manager.get_available_categories() if document_manager else []
+    if not categories:
+        return None
+    
+    selected = st.selectbox(
+        "검색할 문서 카테고리",
+        options=["전체"] + categories,
+        key="chat_category_filter_key"
+    )
+    return None if selected == "전체" else selected
+
 def render_file_uploader(document_manager, username=None):
     """파일 업로드 UI 컴포넌트"""
     st.sidebar.header("문서 업로드 (관리자 전용)")
@@ -265,7 +285,7 @@ def render_performance_tips():
     ```
     
     ### 2. 벡터 저장소 최적화
-    - 대용량 문서의 경우 청크 크기를 조정하세요 (기본값 1000)
+    - 대용량 문서의 경우 청크 크기를 조정하세요 (기본값 1000 토큰)
     - 문서가 많은 경우 카테고리별로 벡터 저장소를 분리하세요
     
     ### 3. 데이터베이스 최적화
@@ -4,6 +4,8 @@ import hashlib
 import os
 from typing import Dict, List, Optional, Any
 import datetime
+import bcrypt
+from db_models import User, hash_password
 
 class UserManager:
     """사용자 관리 클래스: DB 기반 사용자 인증, 권한 관리 등 기능 제공"""
@@ -16,12 +18,7 @@ class UserManager:
     
     def _hash_password(self, password: str) -> str:
         """비밀번호 해싱 처리 - bcrypt 직접 사용"""
-        try:
-            import bcrypt
-            return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-        except ImportError:
-            # bcrypt가 설치되지 않은 경우 기본 해시 사용 (개발용, 프로덕션에는 권장하지 않음)
-            return hashlib.sha256(password.encode()).hexdigest()
+        return hash_password(password)
     # 이전 streamlit_authenticator 사용했을 때    
     # def _hash_password(self, password: str) -> str:
     #     """비밀번호 해싱 처리 - streamlit_authenticator와 호환되게 유지"""
@@ -80,7 +77,6 @@ class UserManager:
             return
     
     # 해당 사용자 정보 조회 (SQLAlchemy 모델 사용)
-        from db_models import User
         user = self.db_session.query(User).filter(User.username == username).first()
         print(f"사용자 인증 시도: {username}")  # 로그 추가
         if user:
@@ -88,7 +84,6 @@ class UserManager:
             try:
                 stored_password = user.password_hash
                 # streamlit_authenticator의 Hasher는 bcrypt를 사용하므로 bcrypt로 직접 검증
-                import bcrypt
                 # 저장된 해시가 이미 bcrypt 형식이면 직접 체크
                 if stored_password.startswith('$2'):
                     password_match = bcrypt.checkpw(password.encode(), stored_password.encode())
@@ -146,7 +141,6 @@ class UserManager:
         username = st.session_state.get("username", "")
         
         # DB에서 최신 정보 조회 (필요시)
-        from db_models import User
         user = self.db_session.query(User).filter(User.username == username).first()
         
         if user:
@@ -169,12 +163,8 @@ class UserManager:
     def add_user(self, username: str, name: str, email: str, password: str, role: str = 'user') -> bool:
         """새 사용자 추가 - SQLAlchemy 모델 사용"""
         try:
-            # DB 모델 가져오기
-            from db_models import User
-            
-            # 사용자 존재 여부 확인
-            existing_user = self.db_session.query(User).filter(User.username == username).first()
-            if existing_user:
+            # 사용자 존재 여부 확인 (EXISTS 조회)
+            if self.db_manager.user_exists(username):
                 return False  # 이미 존재하는 사용자
             
             # 비밀번호 해싱
@@ -202,9 +192,6 @@ class UserManager:
     def update_user(self, username: str, updates: Dict[str, Any]) -> bool:
         """사용자 정보 업데이트 - SQLAlchemy 모델 사용"""
         try:
-            # DB 모델 가져오기
-            from db_models import User
-            
             # 사용자 조회
             user = self.db_session.query(User).filter(User.username == username).first()
             if not user:
@@ -229,9 +216,6 @@ class UserManager:
     def delete_user(self, username: str) -> bool:
         """사용자 삭제 - SQLAlchemy 모델 사용"""
         try:
-            # DB 모델 가져오기
-            from db_models import User
-            
             # 사용자 조회
             user = self.db_session.query(User).filter(User.username == username).first()
             if not user:
@@ -250,9 +234,6 @@ class UserManager:
     def get_all_users(self) -> List[Dict[str, Any]]:
         """모든 사용자 목록 조회 - SQLAlchemy 모델 사용"""
         try:
-            # DB 모델 가져오기
-            from db_models import User
-            
             # 모든 사용자 조회
             users_query = self.db_session.query(User).all()
             
@@ -320,15 +301,13 @@ def admin_panel(user_manager):
         try:
             # 카테고리 조회 - execute_query 대신 안전하게 수정
             if hasattr(user_manager.db_manager, 'session'):
-                from sqlalchemy import text
-                from db_models import DocumentMetadata
-                
-                # SQLAlchemy를 사용하여 카테고리 목록 조회
-                categories_query = user_manager.db_manager.session.query(
-                    DocumentMetadata.category
-                ).distinct()
-                
-                categories = [cat[0] for cat in categories_query]
+                # 문서 관리자의 캐시된 카테고리 목록 사용 (rerun마다 DISTINCT 조회하지 않도록)
+                # 모든 문서가 비활성화된 카테고리도 권한을 관리할 수 있도록 전체 문서 기준으로 조회
+                document_manager = st.session_state.get("document_manager")
+                if document_manager is not None:
+                    categories = document_manager.get_all_categories()
+                else:
+                    categories = user_manager.db_manager.get_all_categories()
                 
                 if categories:
                     selected_category = st.selectbox(
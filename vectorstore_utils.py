@@ -1,39 +1,322 @@
 # vectorstore_utils.py
 import os
 import time
+import hashlib
+import multiprocessing
+import pickle
 import uuid
+import shutil
 import tempfile
+import threading
+import warnings
+import weakref
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+import faiss
 import streamlit as st
 
 # LangChain 관련 라이브러리
-from langchain_community.document_loaders import (
-    PyPDFLoader, 
-    Docx2txtLoader, 
-    CSVLoader, 
-    UnstructuredPowerPointLoader
-)
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+# 전역 벡터 저장소 설정 - 모든 문서의 벡터를 하나의 HNSW 인덱스에 저장
+# (벡터는 fp16 스칼라 양자화로 저장하여 메모리/디스크 사용량을 1/2로 줄임)
+GLOBAL_INDEX_DIRNAME = "global_faiss"
+# 인덱스가 반영하고 있는 활성 문서 구성의 해시 (일치하면 로드 시 정리 검사를 생략)
+DOC_SET_HASH_FILENAME = "doc_set.hash"
+# fp16은 학습된 범위가 필요 없어 이후 추가/재구성되는 벡터도 같은 정밀도로 저장됨
+# (int8은 첫 배치로 학습한 차원별 범위에 이후 벡터가 맞지 않아 검색 품질이 크게 떨어짐)
+HNSW_QUANTIZER = faiss.ScalarQuantizer.QT_fp16
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# 카테고리 필터 검색 시 선택 비율에 따라 늘리는 탐색 폭의 상한
+HNSW_EF_SEARCH_MAX = 1024
+
+# 청크 분할 시 길이 계산에 사용하는 토크나이저
+SPLIT_ENCODING_NAME = "cl100k_base"
+
+# 업로드 파일을 임시 파일로 복사할 때 사용하는 버퍼 크기
+UPLOAD_COPY_BUFFER_SIZE = 1 << 20
+
+# 업로드 임시 파일 디렉토리 (메모리 기반 tmpfs가 있으면 사용)
+UPLOAD_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# 벡터 저장소 파일 기록용 공유 스레드 풀
+_io_executor = ThreadPoolExecutor(max_workers=4)
+
+# 문서 로드/분할용 프로세스 풀 (업로드마다 새로 만들지 않고 재사용, 처음 사용할 때 생성)
+# Streamlit 서버는 멀티스레드이고 faiss/OpenMP가 이미 로드되어 있으므로 fork 대신 spawn으로 작업자 생성
+SPLIT_POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+_split_pool = None
+_split_pool_lock = threading.Lock()
+
+def _get_split_pool():
+    """공유 문서 분할 프로세스 풀 반환"""
+    global _split_pool
+    with _split_pool_lock:
+        if _split_pool is None:
+            _split_pool = ProcessPoolExecutor(
+                max_workers=SPLIT_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _split_pool
+
+def _discard_split_pool(pool):
+    """고장 난 프로세스 풀 폐기 (다음 호출 시 새로 생성)"""
+    global _split_pool
+    with _split_pool_lock:
+        if _split_pool is pool:
+            _split_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+# 전역 인덱스 파일 갱신(디스크에서 로드 → 추가/정리 → 저장)을 세션 간에 직렬화하는 잠금
+_global_index_lock = threading.RLock()
+
+def hash_api_key(api_key):
+    """캐시 키에 사용할 API 키 요약값 (키 원문은 캐시 키에 넣지 않되, 키가 바뀌면 다른 항목이 되도록)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else ""
+
+def get_embeddings(embedding_model="text-embedding-3-small", api_key=None):
+    """API 키별로 캐시된 임베딩 모델 반환"""
+    return _cached_embeddings(embedding_model, hash_api_key(api_key), api_key)
 
 @st.cache_resource(show_spinner=False)
-def get_embeddings(embedding_model="text-embedding-3-small", _api_key=None):
-    """임베딩 모델 초기화 및 캐싱"""
-    return OpenAIEmbeddings(model=embedding_model, api_key=_api_key)
+def _cached_embeddings(embedding_model, api_key_hash, _api_key):
+    """임베딩 모델 초기화 및 캐싱 (모델/API 키 요약값별)"""
+    return OpenAIEmbeddings(model=embedding_model, api_key=_api_key, chunk_size=1000)
+
+def get_global_index_path(data_dir="./db/document"):
+    """전역 벡터 저장소 경로 반환"""
+    return os.path.join(data_dir, GLOBAL_INDEX_DIRNAME)
+
+def _build_vectorstore(embeddings, vectors, documents):
+    """임베딩 벡터와 문서로 HNSW 기반 FAISS 벡터 저장소 생성 (학습 불필요, 점진적 추가 가능)
+    
+    벡터를 단위 길이로 정규화한 뒤 fp16으로 저장하고 내적(코사인 유사도)으로 검색한다.
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexHNSWSQ(vectors.shape[1], HNSW_QUANTIZER, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    index.add(vectors)
+    
+    docstore_ids = [str(uuid.uuid4()) for _ in documents]
+    docstore = InMemoryDocstore(dict(zip(docstore_ids, documents)))
+    return _make_faiss(embeddings, index, docstore, dict(enumerate(docstore_ids)))
+
+def _make_faiss(embeddings, index, docstore, index_to_docstore_id):
+    """인덱스 메트릭에 맞춰 FAISS 래퍼 구성
+    
+    내적 인덱스는 normalize_L2를 켜서 이후 add_embeddings로 추가되는 벡터와 검색 질의 벡터도
+    단위 길이로 정규화되도록 한다 (내적 = 코사인 유사도 유지).
+    """
+    if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+        return FAISS(embeddings, index, docstore, index_to_docstore_id,
+                     distance_strategy=DistanceStrategy.EUCLIDEAN_DISTANCE)
+    
+    # LangChain은 내적 거리에 normalize_L2를 지정하면 경고만 출력하고 정규화는 그대로 수행함
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Normalizing L2 is not applicable")
+        return FAISS(embeddings, index, docstore, index_to_docstore_id,
+                     normalize_L2=True, distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+
+def _export_vectors(vectorstore):
+    """벡터 저장소의 벡터와 문서를 인덱스 순서대로 반환"""
+    total = vectorstore.index.ntotal
+    documents = [vectorstore.docstore._dict[vectorstore.index_to_docstore_id[i]] for i in range(total)]
+    return vectorstore.index.reconstruct_n(0, total), documents
+
+def _read_vectorstore(folder_path, embeddings):
+    """저장된 index.faiss와 docstore(pickle)로 FAISS 래퍼 구성
+    
+    HNSW 인덱스는 faiss의 메모리 매핑 대상(IVF 역리스트)이 아니므로 파일 전체를 RAM으로 읽는다.
+    반환되는 인덱스는 수정 가능한 메모리 사본이다. 신뢰할 수 있는 로컬 파일만 로드해야 한다 (pickle 역직렬화).
+    """
+    index = faiss.read_index(os.path.join(folder_path, "index.faiss"))
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    # 거리 기준/정규화 여부는 pickle에 저장되지 않으므로 인덱스 메트릭에 맞춰 설정
+    return _make_faiss(embeddings, index, docstore, index_to_docstore_id)
+
+def _write_pickle(obj, path):
+    """객체를 pickle 파일로 저장"""
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+
+def _copy_to_temp_file(uploaded_file, file_type, temp_dir=None):
+    """업로드 파일을 temp_dir의 임시 파일로 복사하고 (경로, 내용 해시) 반환"""
+    hasher = hashlib.blake2b(digest_size=16)
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_type}', dir=temp_dir)
+    try:
+        with temp_file:
+            uploaded_file.seek(0)
+            for block in iter(lambda: uploaded_file.read(UPLOAD_COPY_BUFFER_SIZE), b""):
+                hasher.update(block)
+                temp_file.write(block)
+    except OSError:
+        os.unlink(temp_file.name)
+        raise
+    return temp_file.name, hasher.hexdigest()
+
+def _write_temp_file(uploaded_file, file_type):
+    """업로드 파일을 임시 파일로 저장하고 (경로, 내용 해시) 반환
+    
+    1MB 버퍼 단위로 스트리밍하여 파일 전체를 메모리에 복사하지 않으며,
+    같은 블록으로 중복 업로드 확인용 해시도 함께 계산한다.
+    로더가 곧바로 읽고 삭제하는 파일이므로 가능하면 메모리 기반 tmpfs에 기록하고,
+    공간이 부족하면 기본 임시 디렉토리를 사용한다.
+    """
+    if UPLOAD_TEMP_DIR:
+        try:
+            return _copy_to_temp_file(uploaded_file, file_type, UPLOAD_TEMP_DIR)
+        except OSError:
+            pass
+    return _copy_to_temp_file(uploaded_file, file_type)
+
+def _doc_set_hash(doc_entries):
+    """활성 문서 구성(doc_id, 경로, 파일명 목록)의 해시"""
+    return hashlib.blake2b(repr(doc_entries).encode("utf-8"), digest_size=16).hexdigest()
+
+def _read_doc_set_hash(folder_path):
+    """저장된 문서 구성 해시 읽기 - 없으면 None"""
+    try:
+        with open(os.path.join(folder_path, DOC_SET_HASH_FILENAME), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _write_doc_set_hash(folder_path, doc_set_hash):
+    """문서 구성 해시 기록 (None이면 기존 해시 삭제)"""
+    path = os.path.join(folder_path, DOC_SET_HASH_FILENAME)
+    if doc_set_hash is None:
+        if os.path.exists(path):
+            os.unlink(path)
+        return
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(doc_set_hash)
+    os.replace(tmp_path, path)
+
+def _save_vectorstore(vectorstore, folder_path, doc_set_hash=None):
+    """임시 디렉토리에 저장한 뒤 파일 교체
+    
+    다른 세션이 읽는 도중인 기존 파일이 잘리지 않도록 새 파일로 교체한다.
+    doc_set_hash를 모르는 경우(문서 추가 직후 등) 기존 해시를 삭제해 다음 로드 때 다시 검사하게 한다.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp_faiss_", dir=os.path.dirname(os.path.abspath(folder_path)))
+    try:
+        # FAISS.save_local과 같은 형식으로 인덱스와 docstore를 동시에 기록
+        # (faiss.write_index는 GIL을 해제하므로 pickle 직렬화와 겹쳐 실행됨)
+        index_future = _io_executor.submit(
+            faiss.write_index, vectorstore.index, os.path.join(tmp_dir, "index.faiss")
+        )
+        docstore_future = _io_executor.submit(
+            _write_pickle,
+            (vectorstore.docstore, vectorstore.index_to_docstore_id),
+            os.path.join(tmp_dir, "index.pkl")
+        )
+        index_future.result()
+        docstore_future.result()
+        
+        # 인덱스 교체 전에 이전 구성 해시를 먼저 제거 (교체 도중 실패해도 해시가 어긋난 채 남지 않도록)
+        _write_doc_set_hash(folder_path, None)
+        for name in ("index.faiss", "index.pkl"):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(folder_path, name))
+        _write_doc_set_hash(folder_path, doc_set_hash)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 문서 로더는 무거운 의존성(pypdf, unstructured 등)을 끌어오므로 실제 사용 시점에 임포트
+def _pdf_loader(path):
+    from langchain_community.document_loaders import PyPDFLoader
+    # 이미지 추출 비활성화 (이미지 디코딩 비용 제거)
+    return PyPDFLoader(path, extract_images=False)
+
+def _docx_loader(path):
+    from langchain_community.document_loaders import Docx2txtLoader
+    return Docx2txtLoader(path)
+
+def _csv_loader(path):
+    from langchain_community.document_loaders import CSVLoader
+    return CSVLoader(path, autodetect_encoding=True)
+
+def _pptx_loader(path):
+    from langchain_community.document_loaders import UnstructuredPowerPointLoader
+    return UnstructuredPowerPointLoader(path)
+
+# 파일 타입별 로더 생성 함수
+_LOADERS = {
+    'pdf': _pdf_loader,
+    'docx': _docx_loader,
+    'csv': _csv_loader,
+    'pptx': _pptx_loader
+}
 
 def get_loader(file_path, file_type):
     """파일 타입에 맞는 로더 반환"""
-    if file_type == 'pdf':
-        return PyPDFLoader(file_path)
-    elif file_type == 'docx':
-        return Docx2txtLoader(file_path)
-    elif file_type == 'csv':
-        return CSVLoader(file_path)
-    elif file_type == 'pptx':
-        return UnstructuredPowerPointLoader(file_path)
-    else:
+    try:
+        loader_factory = _LOADERS[file_type]
+    except KeyError:
         raise ValueError(f"지원하지 않는 파일 형식: {file_type}")
+    return loader_factory(file_path)
+
+@lru_cache(maxsize=1)
+def _get_text_splitter():
+    """토큰 길이 기준 텍스트 분할기 (작업자 프로세스마다 한 번만 생성)
+    
+    문자 수 대신 tiktoken 토큰 수로 청크 크기를 맞추므로 한글 문서도 LLM 입력 길이에 맞게 분할된다.
+    """
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=SPLIT_ENCODING_NAME,
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+
+def _load_and_split(file_path, file_type, filename, category, version, doc_id, username):
+    """파일 로드 및 청크 분할 - 프로세스 풀 작업자에서 실행"""
+    # 로더 선택 및 문서 로드
+    loader = get_loader(file_path, file_type)
+    loaded_documents = loader.load()
+    
+    # 문서 분할
+    split_documents = _get_text_splitter().split_documents(loaded_documents)
+    
+    # 파일 정보 추가 (메타데이터) - 공통 메타데이터를 한 번 만들고 청크마다 한 번에 병합
+    base_metadata = {
+        "source_file": filename,
+        "file_type": file_type,
+        "category": category,
+        "doc_id": doc_id,
+        "version": version,
+        # 업로더 정보 추가 (사용자별 문서 관리를 위해)
+        "uploaded_by": username
+    }
+    for doc in split_documents:
+        doc.metadata.update(base_metadata)
+    
+    # 문서 메타데이터 생성
+    metadata = {
+        "doc_id": doc_id,
+        "filename": filename,
+        "file_type": file_type,
+        "category": category,
+        "version": version,
+        "chunks": len(split_documents),
+        "uploaded_by": username
+    }
+    
+    return doc_id, metadata, split_documents
 
 def process_documents(uploaded_files, 
                      category=None, 
@@ -45,125 +328,156 @@ def process_documents(uploaded_files,
     """문서 처리 및 임베딩 - 버전 관리 개선"""
     documents = []
     file_info = []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
-        chunk_overlap=200
-    )
+    category = category or "기타"
+    uploader = username or st.session_state.get("username", "system")
     
     # 진행 상황 표시
     progress_bar = st.sidebar.progress(0)
     status_text = st.sidebar.empty()
     
-    for i, uploaded_file in enumerate(uploaded_files):
-        # 진행 상황 업데이트
-        progress = (i / len(uploaded_files))
-        progress_bar.progress(progress)
-        status_text.text(f"처리 중... {uploaded_file.name}")
+    # 1단계: 임시 파일 저장 및 버전 확인 (Streamlit 객체는 메인 스레드에서만 사용)
+    pending = []
+    latest_versions = {}
+    for uploaded_file in uploaded_files:
+        status_text.text(f"준비 중... {uploaded_file.name}")
         
         # 파일 확장자 추출
         file_type = uploaded_file.name.split('.')[-1].lower()
         filename = uploaded_file.name
         
-        # 기존 문서 확인 - 동일 파일명의 문서가 있는지 체크
-        existing_version = 0
-        existing_doc_id = None
+        # 기존 문서 확인 - 동일 파일명의 최신 버전 조회 (같은 배치 내 중복 파일명은 재사용)
+        if filename not in latest_versions:
+            if "document_manager" in st.session_state:
+                latest_versions[filename] = st.session_state.document_manager.get_latest_version(filename, category)
+            else:
+                latest_versions[filename] = (None, 0)
+        existing_doc_id, existing_version = latest_versions[filename]
         
-        if "document_manager" in st.session_state:
-            # 카테고리별 문서 가져오기
-            category_docs = st.session_state.document_manager.get_documents_by_category(
-                category or "기타"
-            )
-            
-            # 동일 파일명 체크
-            for doc in category_docs:
-                if hasattr(doc, 'filename') and doc.filename == filename:
-                    # 기존 문서 중 가장 높은 버전 찾기
-                    if hasattr(doc, 'version') and doc.version > existing_version:
-                        existing_version = doc.version
-                        existing_doc_id = doc.doc_id if hasattr(doc, 'doc_id') else None
+        # 임시 파일 저장은 I/O 스레드 풀에서 파일별로 동시에 진행
+        pending.append({
+            "filename": filename,
+            "file_type": file_type,
+            "temp_file_future": _io_executor.submit(_write_temp_file, uploaded_file, file_type),
+            "existing_version": existing_version,
+            "existing_doc_id": existing_doc_id,
+            # 버전 설정 (기존 문서가 있으면 버전 증가)
+            "new_version": existing_version + 1,
+            # 문서 고유 ID 생성
+            "doc_id": str(uuid.uuid4())
+        })
+    
+    # 임시 파일 저장 완료 대기 및 중복 업로드 확인
+    # (이미 같은 내용이 임베딩되어 있으면 로드/분할/임베딩을 모두 건너뜀)
+    seen_hashes = set()
+    unique_pending = []
+    for item in pending:
+        item["temp_file_path"], item["file_hash"] = item.pop("temp_file_future").result()
         
-        # 버전 설정 (기존 문서가 있으면 버전 증가)
-        new_version = existing_version + 1
+        duplicate = item["file_hash"] in seen_hashes
+        if not duplicate and "document_manager" in st.session_state:
+            duplicate = st.session_state.document_manager.get_document_by_hash(item["file_hash"], category) is not None
+        
+        if duplicate:
+            st.sidebar.info(f"{item['filename']}은(는) 이미 임베딩된 문서와 내용이 같아 건너뜁니다.")
+            os.unlink(item["temp_file_path"])
+            continue
+        
+        seen_hashes.add(item["file_hash"])
+        unique_pending.append(item)
+    pending = unique_pending
+    
+    if not pending:
+        progress_bar.progress(1.0)
+        status_text.text("새로 처리할 문서가 없습니다.")
+        return None, []
+    
+    # 모든 문서가 공유하는 전역 벡터 저장소 경로
+    global_path = get_global_index_path(data_dir)
+    
+    # 2단계: 파일 로드 및 분할을 프로세스 풀에서 병렬 실행 (CPU 바운드 작업)
+    completed = 0
+    
+    version_updates = []
+    
+    pool = _get_split_pool()
+    futures = {
+        pool.submit(
+            _load_and_split,
+            item["temp_file_path"],
+            item["file_type"],
+            item["filename"],
+            category,
+            item["new_version"],
+            item["doc_id"],
+            uploader
+        ): item
+        for item in pending
+    }
+    
+    # 3단계: 완료된 순서대로 결과 수집 (Streamlit 상태 갱신은 메인 스레드에서)
+    for future in as_completed(futures):
+        item = futures[future]
+        filename = item["filename"]
+        existing_version = item["existing_version"]
+        existing_doc_id = item["existing_doc_id"]
+        new_version = item["new_version"]
+        
+        completed += 1
+        progress_bar.progress(completed / len(pending))
+        status_text.text(f"처리 중... {filename}")
         
-        # 임시 파일로 저장
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_type}') as temp_file:
-            temp_file.write(uploaded_file.getvalue())
-            temp_file_path = temp_file.name
-            
         try:
-            # 로더 선택 및 문서 로드
-            loader = get_loader(temp_file_path, file_type)
-            loaded_documents = loader.load()
-            
-            # 문서 분할
-            split_documents = text_splitter.split_documents(loaded_documents)
-            
-            # 문서 고유 ID 생성
-            doc_id = str(uuid.uuid4())
-            
-            # 벡터 저장소 경로 생성
-            vector_store_path = os.path.join(data_dir, f"faiss_index_{uuid.uuid4().hex}")
-            
-            # 파일 정보 추가 (메타데이터)
-            for doc in split_documents:
-                if not doc.metadata:
-                    doc.metadata = {}
-                doc.metadata["source_file"] = filename
-                doc.metadata["file_type"] = file_type
-                doc.metadata["category"] = category or "기타"
-                doc.metadata["doc_id"] = doc_id
-                doc.metadata["version"] = new_version
-                # 업로더 정보 추가 (사용자별 문서 관리를 위해)
-                doc.metadata["uploaded_by"] = username or st.session_state.get("username", "system")
+            doc_id, metadata, split_documents = future.result()
             
             documents.extend(split_documents)
             
-            # 문서 메타데이터 생성
-            metadata = {
-                "doc_id": doc_id,
-                "filename": filename,
-                "file_type": file_type,
-                "category": category or "기타",
-                "version": new_version,
-                "chunks": len(split_documents),
-                "uploaded_by": username or st.session_state.get("username", "system"),
+            metadata.update({
                 "upload_time": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "is_active": True,
-                "vector_store_path": vector_store_path,
-                "description": description or ""
-            }
+                "vector_store_path": global_path,
+                "description": description or "",
+                "file_hash": item["file_hash"]
+            })
             
             file_info.append(metadata)
             
-            # 문서 관리자에 메타데이터 추가
-            if "document_manager" in st.session_state:
-                st.session_state.document_manager.add_document(metadata)
-                
-                # 업데이트인 경우 버전 로그 생성
-                if existing_version > 0 and existing_doc_id:
-                    change_desc = f"새 버전 업로드 - {description or '설명 없음'}"
-                    st.session_state.document_manager.create_document_version_log(
-                        doc_id=doc_id,
-                        previous_version=existing_version,
-                        new_version=new_version,
-                        change_description=change_desc,
-                        changed_by=username or st.session_state.get("username", "system")
-                    )
-                    
-                    # 이전 버전 비활성화 (옵션)
-                    st.session_state.document_manager.update_document_status(existing_doc_id, is_active=False)
+            # 업데이트인 경우 문서 등록 후 버전 로그 생성/이전 버전 비활성화
+            if existing_version > 0 and existing_doc_id:
+                version_updates.append((doc_id, existing_doc_id, existing_version, new_version))
             
             # 버전 정보 표시
             if existing_version > 0:
-                st.sidebar.success(f"{uploaded_file.name} 처리 완료 - 버전 {new_version}로 업데이트됨, {len(split_documents)}개 청크 생성")
+                st.sidebar.success(f"{filename} 처리 완료 - 버전 {new_version}로 업데이트됨, {len(split_documents)}개 청크 생성")
             else:
-                st.sidebar.success(f"{uploaded_file.name} 처리 완료 - {len(split_documents)}개 청크 생성")
+                st.sidebar.success(f"{filename} 처리 완료 - {len(split_documents)}개 청크 생성")
                 
         except Exception as e:
-            st.sidebar.error(f"{uploaded_file.name} 처리 중 오류 발생: {str(e)}")
+            if isinstance(e, BrokenProcessPool):
+                # 작업자 프로세스가 비정상 종료되면 다음 업로드에서 새 풀을 만들도록 폐기
+                _discard_split_pool(pool)
+            st.sidebar.error(f"{filename} 처리 중 오류 발생: {str(e)}")
         finally:
             # 임시 파일 삭제
-            os.unlink(temp_file_path)
+            os.unlink(item["temp_file_path"])
+
+    # 문서 관리자에 메타데이터를 한 번에 추가 (파일마다 INSERT/커밋하지 않도록)
+    if "document_manager" in st.session_state and file_info:
+        document_manager = st.session_state.document_manager
+        document_manager.add_documents(file_info)
+        
+        # 버전 로그도 한 번에 생성
+        change_desc = f"새 버전 업로드 - {description or '설명 없음'}"
+        document_manager.create_document_version_logs_bulk([{
+            "doc_id": doc_id,
+            "previous_version": existing_version,
+            "new_version": new_version,
+            "change_description": change_desc,
+            "changed_by": uploader
+        } for doc_id, _, existing_version, new_version in version_updates])
+        
+        for _, existing_doc_id, _, _ in version_updates:
+            # 이전 버전 비활성화 (옵션)
+            document_manager.update_document_status(existing_doc_id, is_active=False)
     
     # 진행 상황 완료
     progress_bar.progress(1.0)
@@ -175,31 +489,31 @@ def process_documents(uploaded_files,
         # 임베딩 모델 초기화
         embeddings = get_embeddings(embedding_model, api_key)
         
-        # 기존 벡터스토어가 있으면 추가, 없으면 새로 생성
-        if "vectorstore" in st.session_state:
-            try:
-                # 기존 벡터스토어에 문서 추가
-                st.session_state.vectorstore.add_documents(documents)
-                vectorstore = st.session_state.vectorstore
-            except Exception as e:
-                st.sidebar.warning(f"기존 벡터스토어에 추가 실패, 새로 생성합니다: {str(e)}")
-                # FAISS 벡터스토어 생성
-                vectorstore = FAISS.from_documents(documents, embeddings)
-        else:
-            # 새 FAISS 벡터스토어 생성
-            vectorstore = FAISS.from_documents(documents, embeddings)
+        # 전체 청크를 한 번만 임베딩 (OpenAIEmbeddings가 내부적으로 chunk_size 단위로 배치 요청)
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        # 반복되는 청크(머리글/바닥글 등)는 한 번만 요청하고 결과를 재사용
+        unique_texts = list(dict.fromkeys(texts))
+        unique_vectors = dict(zip(unique_texts, embeddings.embed_documents(unique_texts)))
+        vectors = [unique_vectors[text] for text in texts]
+        text_embeddings = list(zip(texts, vectors))
         
-        # 로컬에 벡터스토어 저장 (나중에 로드할 수 있도록)
-        # 각 파일별 벡터스토어 경로 사용
-        for file_meta in file_info:
-            path = file_meta.get("vector_store_path")
-            if path:
-                os.makedirs(path, exist_ok=True)
-                # 이 파일과 관련된 벡터만 저장
-                docs_for_file = [doc for doc in documents if doc.metadata.get("doc_id") == file_meta.get("doc_id")]
-                if docs_for_file:
-                    file_vectorstore = FAISS.from_documents(docs_for_file, embeddings)
-                    file_vectorstore.save_local(path, allow_dangerous_deserialization=True)
+        # 세션 간 공유되는 캐시 객체는 다른 세션이 검색 중일 수 있고 오래된 상태일 수 있으므로 변경하지 않음
+        # - 잠금 안에서 디스크의 최신 인덱스를 새 객체로 읽어 추가한 뒤 저장하고, 그 새 객체를 사용
+        with _global_index_lock:
+            # 기존 벡터스토어가 있으면 점진적으로 추가, 없으면 새로 생성
+            # (어느 경우든 이미 계산된 임베딩만 사용하며 기존 벡터를 버리지 않음)
+            if os.path.exists(os.path.join(global_path, "index.faiss")):
+                vectorstore = _read_vectorstore(global_path, embeddings)
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+            else:
+                vectorstore = _build_vectorstore(embeddings, vectors, documents)
+            
+            # 로컬에 전역 벡터스토어 저장 (나중에 로드할 수 있도록)
+            _save_vectorstore(vectorstore, global_path)
+            
+            # 이전 문서 구성으로 캐시된 인덱스 해제 (다음 로드 시 새 파일을 읽음)
+            _load_global_vectorstore.clear()
         
         st.sidebar.success(f"임베딩 완료! {len(documents)}개 문서 처리됨")
         
@@ -211,50 +525,138 @@ def process_documents(uploaded_files,
         return vectorstore, file_info
     return None, []
 
-@st.cache_resource(show_spinner=False)
-def load_vectorstores(_document_manager, embedding_model="text-embedding-3-small", api_key=None):
-    """모든 문서의 벡터 저장소 로드 및 통합"""
-    if _document_manager is None:
+def load_vectorstores(document_manager, embedding_model="text-embedding-3-small", api_key=None):
+    """전역 벡터 저장소 로드"""
+    if document_manager is None:
         return None
     
     # 활성 문서 목록 가져오기
-    documents = _document_manager.get_all_active_documents()
+    documents = document_manager.get_all_active_documents()
     
     if not documents:
         return None
     
+    # 활성 문서 구성을 캐시 키로 사용 (문서가 추가/삭제되면 다시 로드)
+    doc_entries = tuple(sorted(
+        (
+            doc.doc_id if hasattr(doc, 'doc_id') else "",
+            doc.vector_store_path if hasattr(doc, 'vector_store_path') else None,
+            doc.filename if hasattr(doc, 'filename') else "알 수 없음"
+        )
+        for doc in documents
+    ))
+    
+    # 캐시 키는 문서 구성 해시만 사용 (문서 목록 전체를 매번 해싱하지 않도록)
+    return _load_global_vectorstore(
+        document_manager.data_dir, _doc_set_hash(doc_entries), doc_entries,
+        embedding_model, hash_api_key(api_key), api_key
+    )
+
+def _scan_subdirectories(data_dir):
+    """데이터 디렉토리의 하위 디렉토리 이름 집합 반환"""
+    if not os.path.isdir(data_dir):
+        return set()
+    with os.scandir(data_dir) as entries:
+        return {entry.name for entry in entries if entry.is_dir()}
+
+def _vector_path_exists(vector_path, data_dir, existing_dirs):
+    """벡터 저장소 경로 존재 여부 확인 - 데이터 디렉토리 하위면 스캔 결과 사용"""
+    vector_path = os.path.abspath(vector_path)
+    if os.path.dirname(vector_path) == os.path.abspath(data_dir):
+        return os.path.basename(vector_path) in existing_dirs
+    return os.path.exists(vector_path)
+
+# 프로세스 전체에서 공유하는 RAM 상주 인덱스 (세션마다 다시 읽지 않음)
+# 문서 구성이 바뀌면 이전 구성의 인덱스는 더 이상 필요 없으므로 최신 항목 하나만 유지
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_global_vectorstore(data_dir, doc_set_hash, _doc_entries, embedding_model="text-embedding-3-small",
+                             api_key_hash="", _api_key=None):
+    """전역 벡터 저장소를 로드하고 필요한 경우 정리 (활성 문서 구성별 캐싱)
+    
+    저장된 문서 구성 해시가 현재 구성과 같으면 파일 로드만 수행한다.
+    그렇지 않으면 이전 방식의 문서별 벡터 저장소를 전역 인덱스로 이전하고,
+    비활성/삭제된 문서의 벡터는 제거한 뒤 다시 저장한다. (이전 형식의 인덱스는 현재 형식으로 재구성)
+    """
+    doc_entries = _doc_entries
     # 임베딩 모델 초기화
-    embeddings = get_embeddings(embedding_model, api_key)
+    embeddings = get_embeddings(embedding_model, _api_key)
+    global_path = get_global_index_path(data_dir)
+    active_doc_ids = {doc_id for doc_id, _, _ in doc_entries}
     
-    # 통합 벡터 저장소
-    combined_vectorstore = None
+    # 정리/재구성 시 파일을 다시 쓰므로 업로드와 같은 잠금 안에서 디스크 상태를 읽고 갱신
+    with _global_index_lock, st.spinner("벡터 저장소 로드 중..."):
+        vectorstore = None
+        if os.path.exists(os.path.join(global_path, "index.faiss")):
+            vectorstore = _read_vectorstore(global_path, embeddings)
+        
+        # 이전 형식(L2 거리, 비양자화, int8 양자화)으로 저장된 인덱스는 현재 형식으로 재구성
+        outdated_format = vectorstore is not None and (
+            vectorstore.index.metric_type != faiss.METRIC_INNER_PRODUCT
+            or not isinstance(vectorstore.index, faiss.IndexHNSWSQ)
+            or faiss.downcast_index(vectorstore.index.storage).sq.qtype != HNSW_QUANTIZER
+        )
+        
+        # 인덱스가 이미 현재 문서 구성을 반영하고 있으면 docstore 순회/디렉토리 스캔 생략
+        if vectorstore is not None and not outdated_format and _read_doc_set_hash(global_path) == doc_set_hash:
+            return vectorstore
+        
+        stored_doc_ids = set()
+        if vectorstore is not None:
+            stored_doc_ids = {doc.metadata.get("doc_id") for doc in vectorstore.docstore._dict.values()}
+        
+        # 전역 인덱스에 없는 이전 방식의 문서별 벡터 저장소
+        # 문서마다 stat 호출 대신 데이터 디렉토리를 한 번만 스캔
+        existing_dirs = _scan_subdirectories(data_dir)
+        legacy_entries = [
+            (doc_id, vector_path, filename)
+            for doc_id, vector_path, filename in doc_entries
+            if vector_path
+            and os.path.abspath(vector_path) != os.path.abspath(global_path)
+            and doc_id not in stored_doc_ids
+            and _vector_path_exists(vector_path, data_dir, existing_dirs)
+        ]
+        stale_doc_ids = stored_doc_ids - active_doc_ids
+        
+        # 변경 사항이 없으면 로드한 인덱스를 그대로 사용 (다음 로드부터 검사를 생략하도록 구성 해시 기록)
+        if not legacy_entries and not stale_doc_ids and not outdated_format:
+            if vectorstore is not None:
+                _write_doc_set_hash(global_path, doc_set_hash)
+            return vectorstore
+        
+        vector_parts = []
+        kept_documents = []
+        
+        # 활성 문서의 벡터만 유지
+        if vectorstore is not None:
+            vectors, stored_documents = _export_vectors(vectorstore)
+            keep = [i for i, doc in enumerate(stored_documents) if doc.metadata.get("doc_id") in active_doc_ids]
+            if keep:
+                vector_parts.append(vectors[keep])
+                kept_documents.extend(stored_documents[i] for i in keep)
+        
+        # 문서별 벡터 저장소를 전역 인덱스로 이전
+        for _, vector_path, filename in legacy_entries:
+            try:
+                doc_vectorstore = FAISS.load_local(
+                    vector_path, 
+                    embeddings, 
+                    allow_dangerous_deserialization=True
+                )
+                vectors, shard_documents = _export_vectors(doc_vectorstore)
+                if shard_documents:
+                    vector_parts.append(vectors)
+                    kept_documents.extend(shard_documents)
+            except Exception as e:
+                st.warning(f"문서 '{filename}' 벡터 저장소 로드 실패: {str(e)}")
+        
+        if not kept_documents:
+            shutil.rmtree(global_path, ignore_errors=True)
+            return None
+        
+        vectorstore = _build_vectorstore(embeddings, np.vstack(vector_parts), kept_documents)
+        _save_vectorstore(vectorstore, global_path, doc_set_hash)
     
-    # 로딩 상태 표시
-    with st.spinner("벡터 저장소 로드 중..."):
-        # 각 문서의 벡터 저장소 로드 및 통합
-        for doc in documents:
-            # SQLAlchemy 모델의 속성에 직접 접근
-            vector_path = doc.vector_store_path if hasattr(doc, 'vector_store_path') else None
-            
-            if vector_path and os.path.exists(vector_path):
-                try:
-                    # 벡터 저장소 로드 (보안 옵션 추가)
-                    doc_vectorstore = FAISS.load_local(
-                        vector_path, 
-                        embeddings, 
-                        allow_dangerous_deserialization=True  # 신뢰할 수 있는 로컬 파일이므로 허용
-                    )
-                    
-                    if combined_vectorstore is None:
-                        combined_vectorstore = doc_vectorstore
-                    else:
-                        # 벡터 저장소 병합
-                        combined_vectorstore.merge_from(doc_vectorstore)
-                except Exception as e:
-                    filename = doc.filename if hasattr(doc, 'filename') else "알 수 없음"
-                    st.warning(f"문서 '{filename}' 벡터 저장소 로드 실패: {str(e)}")
-    
-    return combined_vectorstore
+    return vectorstore
 
 # vectorstore_utils.py에 추가 #보안이 필요한 상황에 대해서 하단 참고할 것 #현재 미사용
 def secure_load_vectorstore(vector_path, embeddings):
@@ -282,15 +684,117 @@ def secure_load_vectorstore(vector_path, embeddings):
         print(f"보안 경고: 벡터 저장소 로드 실패 - {vector_path} - {str(e)}")
         return None
 
+def _build_doc_chunk_map(vectorstore):
+    """doc_id -> 인덱스 순서대로 정렬된 docstore ID 목록 (문서 보기 시 벡터 검색 없이 청크 조회용)"""
+    doc_chunks = {}
+    if vectorstore is None:
+        return doc_chunks
+
+    for position in sorted(vectorstore.index_to_docstore_id):
+        docstore_id = vectorstore.index_to_docstore_id[position]
+        doc = vectorstore.docstore._dict.get(docstore_id)
+        if doc is not None:
+            doc_chunks.setdefault(doc.metadata.get("doc_id"), []).append(docstore_id)
+    return doc_chunks
+
+def set_session_vectorstore(vectorstore):
+    """세션 벡터 저장소 교체 및 청크 수/문서별 청크 맵 갱신 (매 rerun마다 docstore를 순회하지 않도록)"""
+    st.session_state.vectorstore = vectorstore
+    try:
+        st.session_state.vectorstore_doc_count = len(vectorstore.docstore._dict) if vectorstore is not None else 0
+        st.session_state.vectorstore_doc_chunks = _build_doc_chunk_map(vectorstore)
+        # 인덱스에 들어 있는 문서 구성(doc_id 집합)의 해시 - 응답 캐시 키에 사용
+        st.session_state.vectorstore_doc_set_hash = _doc_set_hash(tuple(sorted(
+            str(doc_id) for doc_id in st.session_state.vectorstore_doc_chunks
+        )))
+    except Exception as e:
+        print(f"벡터 스토어 확인 중 오류: {str(e)}")
+        st.session_state.vectorstore_doc_count = 0
+        st.session_state.vectorstore_doc_chunks = {}
+        st.session_state.vectorstore_doc_set_hash = None
+
+def get_document_chunks(vectorstore, doc_id):
+    """문서 ID에 해당하는 청크를 메타데이터 맵으로 직접 조회 (임베딩/유사도 검색 없음)"""
+    doc_chunks = st.session_state.get("vectorstore_doc_chunks")
+    if doc_chunks is None:
+        doc_chunks = st.session_state.vectorstore_doc_chunks = _build_doc_chunk_map(vectorstore)
+
+    chunks = []
+    for docstore_id in doc_chunks.get(doc_id, []):
+        doc = vectorstore.docstore.search(docstore_id)
+        if not isinstance(doc, str):  # InMemoryDocstore는 없는 ID에 대해 안내 문자열을 반환
+            chunks.append(doc)
+    return chunks
+
+# 벡터 저장소별 카테고리 → 인덱스 위치 배열
+# (저장소 객체는 교체만 되고 변경되지 않으므로 객체마다 한 번만 계산)
+_category_positions_cache = weakref.WeakKeyDictionary()
+_category_positions_lock = threading.Lock()
+
+def _category_positions(vectorstore):
+    """카테고리별 인덱스 위치(int64 배열) 맵 반환"""
+    with _category_positions_lock:
+        positions = _category_positions_cache.get(vectorstore)
+        if positions is None:
+            grouped = {}
+            for position, docstore_id in vectorstore.index_to_docstore_id.items():
+                doc = vectorstore.docstore._dict.get(docstore_id)
+                if doc is not None:
+                    grouped.setdefault(doc.metadata.get("category"), []).append(position)
+            positions = {category: np.array(ids, dtype=np.int64) for category, ids in grouped.items()}
+            _category_positions_cache[vectorstore] = positions
+    return positions
+
+def similarity_search_in_category(vectorstore, query_vector, category, k):
+    """카테고리에 속한 벡터만 대상으로 검색하여 [(문서, 점수)] 반환
+    
+    검색 후 메타데이터로 거르지 않고 IDSelector로 인덱스 검색 대상 자체를 제한하므로,
+    전체 인덱스에서 비중이 작은 카테고리도 후보가 잘리지 않는다.
+    """
+    positions = _category_positions(vectorstore).get(category)
+    if positions is None or len(positions) == 0:
+        return []
+    
+    index = vectorstore.index
+    k = min(k, len(positions))
+    query = np.array([query_vector], dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(query)
+    
+    selector = faiss.IDSelectorBatch(positions)
+    if isinstance(index, faiss.IndexHNSW):
+        # 선택 비율이 낮을수록 조건에 맞는 노드가 드물므로 그래프 탐색 폭을 넓힘
+        ef_search = int(HNSW_EF_SEARCH * index.ntotal / len(positions))
+        params = faiss.SearchParametersHNSW(
+            sel=selector, efSearch=min(HNSW_EF_SEARCH_MAX, max(HNSW_EF_SEARCH, ef_search, k))
+        )
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    scores, ids = index.search(query, k, params=params)
+    hits = [(int(position), float(score)) for position, score in zip(ids[0], scores[0]) if position >= 0]
+    
+    # 그래프 탐색으로 k개를 채우지 못하면 (아주 작은 카테고리 등) 해당 벡터만 직접 비교해 정확히 검색
+    if len(hits) < k:
+        vectors = index.reconstruct_batch(positions)
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            exact_scores = vectors @ query[0]
+            order = np.argsort(-exact_scores)[:k]
+        else:
+            exact_scores = ((vectors - query[0]) ** 2).sum(axis=1)
+            order = np.argsort(exact_scores)[:k]
+        hits = [(int(positions[i]), float(exact_scores[i])) for i in order]
+    
+    return [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]), score)
+        for position, score in hits
+    ]
+
 def check_vectorstore_status():
     """벡터 저장소 상태 확인 및 메시지 반환"""
-    if "vectorstore" in st.session_state and st.session_state.vectorstore is not None:
+    if st.session_state.get("vectorstore") is not None:
         # 벡터 스토어의 총 문서 수 확인
-        try:
-            doc_count = len(st.session_state.vectorstore.docstore._dict)
-            if doc_count > 0:
-                return True, f"문서가 임베딩되었습니다. {doc_count}개의 문서 청크가 검색 가능합니다."
-        except Exception as e:
-            print(f"벡터 스토어 확인 중 오류: {str(e)}")
+        doc_count = st.session_state.get("vectorstore_doc_count", 0)
+        if doc_count > 0:
+            return True, f"문서가 임베딩되었습니다. {doc_count}개의 문서 청크가 검색 가능합니다."
             
     return False, "아직 업로드된 문서가 없습니다. 일반적인 지식을 기반으로 답변합니다. 더 정확한 답변을 위해 관리자에게 문서 업로드를 요청하세요."
\ No newline at end of file